@@ -1,37 +1,35 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import json
+import os
 import sqlite3
+from instrumentation import instrument_fastapi
+from user_store import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, UserStore, normalize_username
+from user_cache import user_cache_from_env
+from user_import import BULK_CHUNK, BulkImportError, detect_format, iter_records, validate
+
 app = FastAPI()
+instrument_fastapi(app)  # GET /metrics: per-route latency, in-flight requests, SQLite timings, loop lag
+
+MESSAGES = {"inserted": "User added successfully", "updated": "User password updated successfully"}
 
+# Schema is created once here; requests share a pool of WAL connections (one writer, USER_DB_READERS readers).
+# Lookups and listing pages go through an LRU cache (USER_CACHE_SIZE, 0 disables; USER_CACHE_NEGATIVE_TTL
+# also caches unknown usernames; USER_CACHE_PAGE_BYTES caps the memory held by cached pages).
+store = None
 
-def init_db():
-    conn = sqlite3.connect("users.db")
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT
-        )
-    """)
-    conn.commit()
-    return conn
-
-init_db()
- 
-def get_db_connection():
-	conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT
-        )"""
-    )
-    conn.commit()
-    conn.close()
 
+@app.on_event("startup")
+async def startup_event():
+    global store
+    store = UserStore(os.environ.get("USER_DB", "users.db"), readers=int(os.environ.get("USER_DB_READERS", 4)),
+                      cache=user_cache_from_env())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    store.close()
+
 
 @app.get("/")
 def read_root():
@@ -39,54 +37,135 @@ def read_root():
 
 
 @app.post("/add_user/")
-def add_user(username: str, password: str):
-	try :
-		conn = get_db_connection()
-		cursor = conn.cursor()
-		
-		# Check if the user already exists
-		cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-		user = cursor.fetchone()
-		
-		if user:
-			# Update password if user exists
-			cursor.execute("UPDATE users SET password = ? WHERE username = ?", (password, username))
-			message = "User password updated successfully"
-		else:
-			# Insert new user
-			cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-			message = "User added successfully"
-
-		conn.commit()
-		conn.close()
-		return {"message": message, "username" : username }
-	except Exception :
-	    return { "Exception" : Exception }
-		
+async def add_user(username: str, password: str):
+    username = normalize_username(username)  # Same as /users/bulk, so " bob" and "bob" are one user
+    if not username:
+        return JSONResponse(status_code=400, content={"error": "username must be a non-empty string"})
+    try:
+        outcome = await store.add_user(username, password)
+        return {"message": MESSAGES[outcome], "username": username}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"Exception": str(e)})
+
+
+@app.post("/users/bulk")
+async def bulk_upsert_users(request: Request, format: str = Query(None, pattern="^(json|ndjson|csv)$"),
+                            chunk_size: int = Query(BULK_CHUNK, ge=1, le=10000)):
+    """Adds or updates many users from a JSON array, NDJSON or CSV (username,password) body.
+
+    The body is parsed as it arrives and applied in transactions of
+    `chunk_size` rows. The response is NDJSON: one {"row", "username",
+    "outcome"} line per input row (outcome is inserted, updated or error) and
+    a final summary line. It is sent once the body is consumed, since the
+    request stream cannot be read from inside a streaming response. If the
+    body stops being parseable part-way (e.g. a bad CSV header or JSON
+    array), the status is 400 and the lines before the error show which
+    chunks were already applied. If a chunk's transaction fails, its rows
+    are reported as errors, the import continues with the next chunk and
+    the status is 207.
+    """
+    try:
+        fmt = detect_format(request.headers.get("content-type"), format)
+    except BulkImportError as e:
+        return JSONResponse(status_code=415, content={"error": str(e)})
+
+    failed = False
+    partial = False
+
+    async def apply():
+        nonlocal failed
+        totals = {"inserted": 0, "updated": 0, "error": 0}
+        chunk = []  # (row number, username, password, error) in input order
+
+        async def flush():
+            nonlocal partial
+            valid = [(u, p) for _, u, p, error in chunk if error is None]
+            try:
+                outcomes = iter(await store.upsert_users(valid) if valid else [])
+            except sqlite3.Error as e:
+                # The chunk's transaction was rolled back; report its rows and go on
+                partial = True
+                chunk[:] = [(number, u, p, error or f"database error: {e}") for number, u, p, error in chunk]
+            lines = []
+            for number, username, _, error in chunk:
+                if error is None:
+                    outcome = next(outcomes)
+                    line = {"row": number, "username": username, "outcome": outcome}
+                else:
+                    outcome = "error"
+                    line = {"row": number, "outcome": outcome, "error": error}
+                totals[outcome] += 1
+                lines.append(json.dumps(line) + "\n")
+            chunk.clear()
+            return "".join(lines)
+
+        try:
+            async for number, record in iter_records(request.stream(), fmt):
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    chunk.append((number, *validate(record), None))
+                except ValueError as e:
+                    chunk.append((number, None, None, str(e)))
+                if len(chunk) >= chunk_size:
+                    yield await flush()
+            if chunk:
+                yield await flush()
+        except BulkImportError as e:
+            failed = True
+            yield json.dumps({"error": str(e)}) + "\n"
+        yield json.dumps({"summary": totals}) + "\n"
+
+    lines = [line async for line in apply()]
+    status_code = 400 if failed else 207 if partial else 200
+    return Response("".join(lines), status_code=status_code, media_type="application/x-ndjson")
 
 
 @app.get("/get_users/")
-def get_users():
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, password FROM users")
-    users = cursor.fetchall()
-    conn.close()
-	 if not users:
+async def get_users(cursor: str = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                    prefix: str = Query(None, min_length=1)):
+    """Returns one page of usernames; pass next_cursor back as `cursor` for the next page."""
+    try:
+        rows, next_cursor = await store.list_page(cursor, limit, prefix)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if not rows and cursor is None:
         return {"message": "No users found in the database"}
-    return {"users": [user[1] for user in users]}
-    #return {"users": users}
+    return {"users": [username for _, username in rows], "next_cursor": next_cursor}
+
+
+@app.get("/users/{username}")
+async def get_user(username: str):
+    """Looks up one user (served from the cache when hot)."""
+    user = await store.get_user(username)
+    if user is None:
+        return JSONResponse(status_code=404, content={"message": "User not found", "username": username})
+    return {"id": user[0], "username": user[1]}
+
+
+@app.get("/get_users/export")
+async def export_users(prefix: str = Query(None, min_length=1)):
+    """Streams every (matching) user as NDJSON {"id", "username"} lines in constant memory."""
+    async def generate():
+        async for user_id, username in store.iter_users(prefix):
+            yield json.dumps({"id": user_id, "username": username}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
+@app.get("/db_stats")
+async def get_db_stats():
+    """Returns connection pool usage, average query times and cache statistics."""
+    return store.stats()
 
 
+@app.get("/cache_stats")
+async def get_cache_stats():
+    """Returns user cache hit rates, size and estimated memory."""
+    return store.cache.stats() if store.cache is not None else {"enabled": False}
 
 
 
-		
-#curl http:/192.168.1.10:8000/		
-#curl http:/192.168.1.10:8000/get_users/		
+#curl http:/192.168.1.10:8000/
+#curl http:/192.168.1.10:8000/get_users/
 #curl -X POST "http://192.168.1.10:8000/add_user/?username=testuser&password=pass123"
-		
-		
-    	
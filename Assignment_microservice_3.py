@@ -1,129 +1,31 @@
 # pip install fastapi uvicorn psutil matplotlib aiofiles sqlite3 aioredis websockets google-cloud-compute
 
-from fastapi import FastAPI, BackgroundTasks, WebSocket
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, BackgroundTasks, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
 import psutil
 import asyncio
 import threading
 import time
-import io
-import sqlite3
-import matplotlib.pyplot as plt
 from datetime import datetime
 import subprocess
 import os
 from google.cloud import compute_v1
+from metrics_writer import MetricsWriter
+from sqlite_wal import connect
+from usage_rollups import query_history
+from usage_hub import BroadcastHub
+from usage_graph import GraphCache, etag_matches, make_etag, pack_series
+from ring_buffer import MetricRingBuffer
+from host_metrics import HostMetricsCollector, parse_intervals
+from autoscale_policy import Observation, make_policy, parse_params
+from cloud_backend import backend_from_env
+from provisioning import ProvisioningQueue
+from warm_pool import WarmPool
+from fleet import FleetManager, FleetRegistry
+from instrumentation import instrument_fastapi, observe_query
 
 app = FastAPI()
-
-
-def authenticate_gcloud():
-    try:
-        print("Authenticating gcloud account...")
-        key_file = "/home/suvendu/VCC/VCC_m22aie218_assignment_1/project-1-autoscale-gcp-vm-e4be10f24915.json"  # Update with the actual path
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_file
-        subprocess.run(["gcloud", "auth", "activate-service-account", "--key-file", key_file], check=True)
-        subprocess.run(["gcloud", "config", "set", "project", "project-1-autoscale-gcp-vm"], check=True)
-        print("Authentication successful.")
-    except subprocess.CalledProcessError as e:
-        print("Failed to authenticate gcloud account:", str(e))
-
-def configure_ssh_keys():
-    try:
-        print("Configuring SSH keys in project metadata...")
-        subprocess.run(["gcloud", "compute", "project-info", "add-metadata",
-                        "--metadata-from-file", "ssh-keys=" + os.path.expanduser("~/.ssh/google_compute_engine.pub")], check=True)
-        print("SSH keys configured successfully.")
-    except subprocess.CalledProcessError as e:
-        print("Failed to configure SSH keys. Please check your setup.", str(e))
-
-def create_firewall_rule():
-    try:
-        print("Creating firewall rule for backend server on port 5000...")
-        subprocess.run([
-            "gcloud", "compute", "firewall-rules", "create", "allow-backend-5000",
-            "--allow", "tcp:5000",
-            "--source-ranges", "0.0.0.0/0",
-            "--target-tags", "backend-server",
-            "--description", "Allow incoming traffic on port 5000 for backend server"
-        ], check=True)
-        print("Firewall rule created successfully.")
-    except subprocess.CalledProcessError as e:
-        print("Failed to create firewall rule:", str(e))
-
-def add_network_tag(instance_name, zone):
-    try:
-        print("Adding network tag to GCP instance...")
-        subprocess.run([
-            "gcloud", "compute", "instances", "add-tags", instance_name,
-            "--zone", zone,
-            "--tags=backend-server"
-        ], check=True)
-        print("Network tag added successfully.")
-    except subprocess.CalledProcessError as e:
-        print("Failed to add network tag:", str(e))
-
-
-def install_docker_and_run_container(instance_name, zone):
-    try:
-        print("Installing Docker and running container on the GCP instance...")
-        startup_script = """
-        #!/bin/bash
-        sudo apt update
-        sudo apt install -y docker.io
-        sudo systemctl start docker
-        sudo systemctl enable docker
-        sudo docker pull suvendu2023/flask-news-ai
-        sudo docker run -d -p 5000:5000 suvendu2023/flask-news-ai
-        """
-        
-        subprocess.run([
-            "gcloud", "compute", "instances", "add-metadata", instance_name,
-            "--zone", zone,
-            "--metadata=startup-script=" + startup_script
-        ], check=True)
-        print("Docker installed, image pulled, and container started successfully.")
-    except subprocess.CalledProcessError as e:
-        print("Failed to install Docker or run container:", str(e))
-        
-def create_gcp_instance():
-    PROJECT_ID = "project-1-autoscale-gcp-vm"
-    ZONE = "us-central1-c"
-    MACHINE_TYPE = "e2-medium"
-    IMAGE_PROJECT = "ubuntu-os-cloud"
-    IMAGE_FAMILY = "ubuntu-2004-lts"
-    
-    instance_client = compute_v1.InstancesClient()
-
-    instance = compute_v1.Instance()
-    instance.name = f"auto-scaled-instance-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    instance.machine_type = f"zones/{ZONE}/machineTypes/{MACHINE_TYPE}"
-
-    disk = compute_v1.AttachedDisk()
-    disk.initialize_params = compute_v1.AttachedDiskInitializeParams(
-        source_image=f"projects/{IMAGE_PROJECT}/global/images/family/{IMAGE_FAMILY}"
-    )
-    disk.auto_delete = True
-    disk.boot = True
-    instance.disks = [disk]
-
-    network_interface = compute_v1.NetworkInterface()
-    network_interface.name = "global/networks/default"
-    network_interface.access_configs = [compute_v1.AccessConfig(name="External NAT", type_="ONE_TO_ONE_NAT")]
-    instance.network_interfaces = [network_interface]
-
-    try:
-        operation = instance_client.insert(project=PROJECT_ID, zone=ZONE, instance_resource=instance)
-        print(f"Launched GCP VM: {operation}")
-        operation.result()
-        print(f"Instance {instance.name} created successfully.")
-        
-        add_network_tag(instance.name, ZONE)
-        install_docker_and_run_container(instance.name, ZONE)
-    except Exception as e:
-        print(f"Error creating instance: {e}")        
-
-
+instrument_fastapi(app)  # GET /metrics: per-route latency, in-flight requests, SQLite timings, loop lag
 
 
 PROJECT_ID = "project-1-autoscale-gcp-vm"
@@ -159,55 +61,111 @@ def create_gcp_instance_old():
 
 #app = FastAPI()
 
-cpu_ram_data = []
 stress_ng_process = None
-cpu_overload_start = None
-
-# Initialize SQLite database
-conn = sqlite3.connect("system_usage.db", check_same_thread=False)
-cursor = conn.cursor()
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS usage (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        cpu_usage REAL,
-        ram_usage REAL
-    )
-''')
-conn.commit()
 
-async def update_usage():
-    """Continuously updates CPU & RAM usage every 5 seconds and checks overload."""
-    global cpu_overload_start
+# Sampling period for the monitor loop (seconds)
+SAMPLE_INTERVAL = float(os.environ.get("SAMPLE_INTERVAL", 5))
+
+# SQLite writes are batched in a background thread (WAL mode, one commit per interval)
+metrics_writer = MetricsWriter("system_usage.db", flush_interval=float(os.environ.get("DB_FLUSH_INTERVAL", 5)))
+
+# The sampler is the only caller of psutil; /cpu_ram and /ws read from this hub
+usage_hub = BroadcastHub(queue_size=int(os.environ.get("WS_QUEUE_SIZE", 16)))
+
+# PNG of the latest data version, rendered in a worker thread
+graph_cache = GraphCache()
 
+# In-memory history: hours of samples in a preallocated NumPy ring buffer
+usage_buffer = MetricRingBuffer(("cpu", "ram"), capacity=int(os.environ.get("USAGE_BUFFER_SIZE", 6 * 3600)))
+GRAPH_POINTS = 20  # Samples shown by /cpu_ram_graph and /cpu_ram/series
+
+# Per-core CPU, load, disk/net I/O and top processes, each group on its own interval
+host_metrics = HostMetricsCollector(metrics_writer, parse_intervals(os.environ.get("HOST_METRICS")))
+
+# Fleet size limits, counting this host
+FLEET_MIN = int(os.environ.get("FLEET_MIN", 1))
+FLEET_MAX = int(os.environ.get("FLEET_MAX", 5))
+
+# Autoscaling policy, e.g. AUTOSCALE_POLICY=ewma AUTOSCALE_PARAMS="alpha=0.3,high=70,cooldown=600"
+# (tune offline first with autoscale_replay.py against system_usage.db)
+autoscale_policy = make_policy(os.environ.get("AUTOSCALE_POLICY", "threshold"),
+                               **{"min_instances": FLEET_MIN, "max_instances": FLEET_MAX,
+                                  **parse_params(os.environ.get("AUTOSCALE_PARAMS"))})
+scale_events = []
+
+# The policy sees CPU/RAM averaged over this many seconds of usage_buffer; 0 (the
+# default) is the newest sample alone, which is what autoscale_replay.py replays
+AUTOSCALE_WINDOW = float(os.environ.get("AUTOSCALE_WINDOW", 0))
+# Threshold for /cpu_ram/stats when the active policy has no `high` of its own
+CPU_OVERLOAD_THRESHOLD = 75
+
+def usage_observation(now):
+    """Builds the policy's Observation from the ring buffer window ending at the newest sample."""
+    _, cpu = usage_buffer.series("cpu", seconds=AUTOSCALE_WINDOW)
+    _, ram = usage_buffer.series("ram", seconds=AUTOSCALE_WINDOW)
+    return Observation(now, float(cpu.mean()), float(ram.mean()))
+
+async def update_usage():
+    """Continuously updates CPU & RAM usage every SAMPLE_INTERVAL seconds and checks overload."""
+    psutil.cpu_percent(interval=None)  # Prime the counter; later calls measure since the previous one
+    await asyncio.sleep(min(1.0, SAMPLE_INTERVAL))  # Have a first sample quickly after startup
     while True:
-        cpu_usage = psutil.cpu_percent(interval=1)
+        cpu_usage = psutil.cpu_percent(interval=None)
         ram_usage = psutil.virtual_memory().percent
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # Store in database
-        cursor.execute("INSERT INTO usage (timestamp, cpu_usage, ram_usage) VALUES (?, ?, ?)",
-                       (timestamp, cpu_usage, ram_usage))
-        conn.commit()
-
-        # Store in memory (keep last 20 records)
-        cpu_ram_data.append((timestamp, cpu_usage, ram_usage))
-        if len(cpu_ram_data) > 20:
-            cpu_ram_data.pop(0)
-
-        # Check if CPU usage is above 75%
-        if cpu_usage > 75:
-            if cpu_overload_start is None:
-                cpu_overload_start = time.time()
-            elif time.time() - cpu_overload_start >= 10:  # If overload persists for 10 seconds
-                if stress_ng_process is None or stress_ng_process.poll() is not None:
-                    print("CPU overload detected! Increasing CPU load with stress-ng and creating instance...")
-                    start_cpu_load()
-                    
-        else:
-            cpu_overload_start = None  # Reset overload timer
-
-        await asyncio.sleep(5)
+        now = time.time()
+        timestamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+
+        # Push to /cpu_ram and websocket subscribers
+        usage_hub.publish({
+            "timestamp": timestamp,
+            "epoch": int(now),
+            "cpu_usage": cpu_usage,
+            "ram_usage": ram_usage
+        })
+
+        # Store in database (buffered, written off the event loop)
+        metrics_writer.add(now, cpu_usage, ram_usage)
+
+        # Store in memory
+        usage_buffer.append(int(now), (cpu_usage, ram_usage))
+
+        # Let the autoscaling policy decide (it applies hysteresis, cooldown and fleet limits)
+        apply_scaling(autoscale_policy.decide(usage_observation(now), fleet.size()), now)
+
+        await asyncio.sleep(SAMPLE_INTERVAL)
+
+# Scale-out runs as background jobs; CLOUD_BACKEND=fake provisions in-process for local load tests
+cloud = backend_from_env()
+
+# Spare instances promoted on scale-out (WARM_POOL_MODE=stopped keeps them stopped, running keeps them booted).
+# BAKED_IMAGE (e.g. projects/<project>/global/images/family/flask-news-ai, see /scale/bake) skips the apt/docker
+# setup; stopped mode needs it, so without one the pool defaults to running mode.
+BAKED_IMAGE = os.environ.get("BAKED_IMAGE") or None
+warm_pool = WarmPool(cloud, size=int(os.environ.get("WARM_POOL_SIZE", 0)),
+                     mode=os.environ.get("WARM_POOL_MODE", "stopped" if BAKED_IMAGE else "running"),
+                     source_image=BAKED_IMAGE)
+
+# Launched instances are recorded in system_usage.db and reconciled with the provider on startup
+fleet = FleetManager(cloud, FleetRegistry("system_usage.db"), warm_pool, min_size=FLEET_MIN, max_size=FLEET_MAX,
+                     drain_seconds=float(os.environ.get("FLEET_DRAIN_SECONDS", 60)))
+warm_pool.on_ready = fleet.on_warm_ready
+provisioning = ProvisioningQueue(cloud, max_concurrent=int(os.environ.get("PROVISION_CONCURRENCY", 4)),
+                                 warm_pool=warm_pool, source_image=BAKED_IMAGE, on_start=fleet.on_job_started,
+                                 on_success=fleet.on_job_succeeded, on_failure=fleet.on_job_failed)
+
+def apply_scaling(decision, now):
+    """Acts on a policy decision by queueing one provisioning job per instance."""
+    if decision.delta == 0:
+        return
+    scale_events.append({"timestamp": int(now), "delta": decision.delta, "reason": decision.reason})
+    del scale_events[:-100]
+    if decision.delta > 0:
+        print(f"Scaling out: {decision.reason}")
+        for i in range(min(decision.delta, fleet.max_size - fleet.size())):
+            # Keyed by decision, so a repeated decision cannot launch extra instances
+            provisioning.submit(f"scale-{int(now)}-{i}")
+    else:
+        print(f"Scaling in: {decision.reason}; draining {fleet.scale_in(-decision.delta)}")
 
 @app.get("/start_cpu_load") #changed to get
 async def start_cpu_load():
@@ -216,13 +174,9 @@ async def start_cpu_load():
     if stress_ng_process is None or stress_ng_process.poll() is not None:
         try:
             stress_ng_process = subprocess.Popen(["stress-ng", "--cpu", str(psutil.cpu_count() // 2), "--timeout", "20s"]) # using half the cores for 20 seconds.
-            authenticate_gcloud()
-            create_gcp_instance()
-            configure_ssh_keys()
-            create_firewall_rule()
-            #create_gcp_instance()
+            job = provisioning.submit()
             
-            return {"message": "CPU load started."}
+            return {"message": "CPU load started.", "job": job.id}
         except FileNotFoundError:
             return {"error": "stress-ng not found. Please install it."}
         except Exception as e:
@@ -244,62 +198,195 @@ async def stop_cpu_load():
 @app.on_event("startup")
 async def startup_event():
     """Starts CPU & RAM monitoring when FastAPI launches."""
+    metrics_writer.start()
+    host_metrics.start()
+    try:
+        print("Fleet reconciled:", await fleet.reconcile())
+    except Exception as e:
+        print("Fleet reconciliation failed:", e)
+    fleet.start()
+    warm_pool.refill()
     asyncio.create_task(update_usage())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flushes buffered samples to SQLite."""
+    host_metrics.stop()
+    fleet.stop()
+    await asyncio.to_thread(fleet.registry.close)
+    await asyncio.to_thread(metrics_writer.stop)
+
+@app.get("/autoscale")
+async def get_autoscale():
+    """Returns the active scaling policy, fleet size and recent scale decisions."""
+    return {
+        **autoscale_policy.describe(),
+        "fleet": fleet.stats(),
+        "provisioning": provisioning.stats(),
+        "events": scale_events[-20:],
+    }
+
+@app.get("/fleet")
+async def get_fleet(state: str = None):
+    """Lists registered instances with state, launch time and health."""
+    return {**fleet.stats(), "instances": fleet.registry.instances(state.split(",") if state else None)}
+
+@app.post("/fleet/scale_in")
+async def scale_in_fleet(count: int = Query(1, ge=1)):
+    """Drains and deletes up to `count` of the newest serving instances (never below FLEET_MIN)."""
+    return {"draining": fleet.scale_in(count)}
+
+@app.post("/fleet/reconcile")
+async def reconcile_fleet():
+    """Re-syncs the registry with the provider's instance list."""
+    try:
+        return await fleet.reconcile()
+    except Exception as e:
+        return JSONResponse(status_code=502, content={"error": str(e)})
+
+@app.get("/scale/jobs")
+async def get_scale_jobs(state: str = Query(None, pattern="^(queued|running|succeeded|failed)$")):
+    """Lists provisioning jobs with per-step progress."""
+    return {**provisioning.stats(), "items": provisioning.jobs(state)}
+
+@app.post("/scale/jobs")
+async def create_scale_job(key: str = Query(None, max_length=40, pattern="^[a-z0-9-]+$")):
+    """Queues a scale-out job; repeating a key returns the existing job instead of launching another instance."""
+    return provisioning.submit(key).to_dict()
+
+@app.get("/scale/jobs/{job_id}")
+async def get_scale_job(job_id: str):
+    job = provisioning.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return job.to_dict()
+
+@app.get("/scale/warm_pool")
+async def get_warm_pool():
+    """Returns warm pool occupancy and time-to-serving for warm vs cold scale-outs."""
+    return {**warm_pool.stats(), "time_to_serving": provisioning.time_to_serving()}
+
+@app.post("/scale/bake")
+async def bake_image(instance: str, family: str = Query("flask-news-ai", pattern="^[a-z][a-z0-9-]*$")):
+    """Creates an image from a configured backend instance, for use as BAKED_IMAGE."""
+    try:
+        image = await asyncio.to_thread(cloud.bake_image, instance, family)
+    except Exception as e:
+        return JSONResponse(status_code=502, content={"error": str(e)})
+    return {"image": image}
+
+@app.get("/db_stats")
+async def get_db_stats():
+    """Returns metrics writer buffer and flush statistics."""
+    return metrics_writer.stats()
+
 @app.get("/cpu_ram")
 async def get_cpu_ram_usage():
-    """Returns the latest CPU & RAM usage data."""
-    cpu_usage = psutil.cpu_percent(interval=1)
-    ram_usage = psutil.virtual_memory().percent
+    """Returns the latest CPU & RAM usage sample from the background sampler."""
+    if usage_hub.latest is None:
+        return JSONResponse(content={"error": "No sample yet"}, status_code=503, headers={"Retry-After": "1"})
+    return usage_hub.latest
+
+@app.get("/cpu_ram/stats")
+async def get_cpu_ram_stats(window: int = Query(300, ge=1, description="Window in seconds"),
+                            alpha: float = Query(0.3, gt=0, le=1, description="EWMA smoothing factor")):
+    """Returns window statistics (mean, EWMA, percentiles, rate of change) from the ring buffer."""
+    threshold = getattr(autoscale_policy, "high", CPU_OVERLOAD_THRESHOLD)
     return {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "cpu_usage": cpu_usage,
-        "ram_usage": ram_usage
+        "window": window,
+        "samples_buffered": len(usage_buffer),
+        "cpu_threshold": threshold,
+        "cpu_seconds_above_threshold": usage_buffer.seconds_above("cpu", threshold),
+        "metrics": usage_buffer.summary(seconds=window, alpha=alpha),
     }
 
+@app.get("/host_metrics")
+async def get_host_metrics():
+    """Returns the latest per-core CPU, load, disk/net rates and top processes."""
+    return host_metrics.latest()
+
+@app.get("/host_metrics/{group}")
+async def get_host_metrics_window(group: str, window: int = Query(300, ge=1)):
+    """Returns one metric group's columns over the last `window` seconds."""
+    if group not in host_metrics.buffers:
+        return JSONResponse(content={"error": f"Unknown or disabled group {group!r}"}, status_code=404)
+    return host_metrics.window(group, window)
+
+@app.get("/cpu_ram/subscribers")
+async def get_cpu_ram_subscribers():
+    """Returns websocket fan-out statistics."""
+    return usage_hub.stats()
+
+def read_history(start, end, step):
+    conn = connect("system_usage.db")  # WAL: reads never wait for the writer
+    started = time.perf_counter()
+    try:
+        return query_history(conn, start, end, step)
+    finally:
+        observe_query("system_usage", "history", time.perf_counter() - started)
+        conn.close()
+
+@app.get("/cpu_ram/history")
+async def get_cpu_ram_history(
+    start: int = Query(None, alias="from", description="Start, epoch seconds (default: 1 hour ago)"),
+    end: int = Query(None, alias="to", description="End, epoch seconds (default: now)"),
+    step: int = Query(None, description="Bucket width in seconds (default: ~300 points)"),
+):
+    """Returns min/avg/max/p95 CPU & RAM history, read from the coarsest table that fits `step`."""
+    end = end or int(time.time())
+    start = start or end - 3600
+    step = step or max(1, (end - start) // 300)
+    try:
+        return await asyncio.to_thread(read_history, start, end, step)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+def usage_series(n=GRAPH_POINTS):
+    """Returns (times, cpu_usages, ram_usages, epochs) for the newest n in-memory samples."""
+    epochs, values = usage_buffer.last(n)
+    epochs = epochs.tolist()
+    times = [datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S") for t in epochs]
+    return times, values[0].tolist(), values[1].tolist(), epochs
+
 @app.get("/cpu_ram_graph")
-async def get_cpu_ram_graph():
-    """Generates a live CPU & RAM usage graph and sends it as an image."""
-    times, cpu_usages, ram_usages = zip(*cpu_ram_data) if cpu_ram_data else ([], [], [])
-
-    plt.figure(figsize=(8, 4))
-    plt.plot(times, cpu_usages, marker='o', linestyle='-', color='b', label="CPU Usage")
-    plt.plot(times, ram_usages, marker='s', linestyle='-', color='r', label="RAM Usage")
-    plt.xlabel('Time')
-    plt.ylabel('Usage (%)')
-    plt.title('Real-time CPU & RAM Usage')
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-
-    img = io.BytesIO()
-    plt.savefig(img, format='png')
-    img.seek(0)
-    plt.close()
-
-    return StreamingResponse(img, media_type="image/png")
+async def get_cpu_ram_graph(request: Request):
+    """Sends the live CPU & RAM usage graph, rendered once per data version."""
+    etag = make_etag(usage_hub.published)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    png = await graph_cache.get(usage_hub.published, lambda: usage_series()[:3])
+    return Response(content=png, media_type="image/png", headers=headers)
+
+@app.get("/cpu_ram/series")
+async def get_cpu_ram_series(request: Request, format: str = Query("json", pattern="^(json|binary)$")):
+    """Raw series for client-side charts: compact JSON, or packed binary
+    (uint32 n, int64[n] epochs, float32[n] cpu, float32[n] ram, little-endian)."""
+    etag = make_etag(usage_hub.published, format)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    _, cpu_usages, ram_usages, epochs = usage_series()
+    if format == "binary":
+        return Response(content=pack_series(epochs, cpu_usages, ram_usages),
+                        media_type="application/octet-stream", headers=headers)
+    return JSONResponse(content={"t": epochs, "cpu": cpu_usages, "ram": ram_usages}, headers=headers)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for live updates."""
+    """WebSocket endpoint for live updates pushed by the background sampler."""
     await websocket.accept()
-    try:
-        while True:
-            cpu_usage = psutil.cpu_percent(interval=1)
-            ram_usage = psutil.virtual_memory().percent
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            await websocket.send_json({
-                "timestamp": timestamp,
-                "cpu_usage": cpu_usage,
-                "ram_usage": ram_usage
-            })
-            await asyncio.sleep(5)
-    except Exception as e:
-        print("WebSocket error:", e)
-    finally:
-        await websocket.close()
+    with usage_hub.subscribe() as subscription:
+        try:
+            while True:
+                await websocket.send_json(await subscription.get())
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            print("WebSocket error:", e)
+            await websocket.close()
 
 if __name__ == "__main__":
     import uvicorn
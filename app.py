@@ -1,32 +1,97 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+import json
+import logging
 import os
-import torch
-import torchvision.transforms as transforms
-import torchvision.models as models
-from PIL import Image
-import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from prediction_cache import cache_from_env, model_version
+from instrumentation import instrument_flask, observe_stage
+from preprocessing import StageTimer, ImageTooLarge, decode_image
+
+# torch/torchvision and the modules built on them are imported inside
+# init_inference() so the web server comes up before they finish loading.
 
 app = Flask(__name__)
+instrument_flask(app)  # GET /metrics: per-route latency, in-flight requests, inference stages
+logging.basicConfig(level=logging.INFO)
 
 # Define model storage path
 MODEL_DIR = "model"
 MODEL_PATH = os.path.join(MODEL_DIR, "mobilenet_v2.pth")
 LABELS_PATH = os.path.join(MODEL_DIR, "imagenet_classes.txt")
+LABELS_URL = "https://raw.githubusercontent.com/pytorch/hub/master/imagenet_classes.txt"
+
+# Pre-built bundle from model_bundle.py: weights, labels and compiled model, no network
+MODEL_BUNDLE = os.environ.get("MODEL_BUNDLE")
 
 # Ensure model directory exists
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Download ImageNet class labels if not present
-if not os.path.exists(LABELS_PATH):
-    LABELS_URL = "https://raw.githubusercontent.com/pytorch/hub/master/imagenet_classes.txt"
-    imagenet_classes = requests.get(LABELS_URL).text.splitlines()
-    with open(LABELS_PATH, "w") as f:
-        f.write("\n".join(imagenet_classes))
-else:
+# Inference backend (ignored with MODEL_BUNDLE, which is already compiled)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+CALIBRATION_DIR = os.environ.get("CALIBRATION_DIR", "calibration")
+
+# Batch concurrent requests into one forward pass
+MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", 5))
+
+# INFERENCE_WORKERS > 0 fans batches out to worker processes sharing the weights
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+
+# Startup: load in a background thread (default) and report ready after warmup.
+# The worker pool's supervisor process, which forks every worker (replacements
+# included), must fork from the main thread before Flask starts serving (a fork
+# alongside other threads can inherit locks held by them), so
+# INFERENCE_WORKERS > 0 always initializes in the foreground.
+INIT_IN_BACKGROUND = os.environ.get("INIT_IN_BACKGROUND", "1") == "1" and INFERENCE_WORKERS == 0
+if INFERENCE_WORKERS > 0 and os.environ.get("INIT_IN_BACKGROUND", "1") == "1":
+    logging.warning("INFERENCE_WORKERS=%d: initializing in the foreground so workers fork before serving",
+                    INFERENCE_WORKERS)
+WARMUP_RUNS = int(os.environ.get("WARMUP_RUNS", 3))
+
+# Cache results by upload content so repeat images skip decode and inference
+prediction_cache = cache_from_env()
+
+# Decode large JPEGs at reduced resolution (only what Resize(256) needs)
+REDUCED_DECODE = os.environ.get("REDUCED_DECODE", "1") == "1"
+MAX_INPUT_PIXELS = int(os.environ.get("MAX_INPUT_PIXELS", 50_000_000))
+stage_timer = StageTimer(observer=observe_stage)
+
+# Parallel decode/transform for /predict_batch
+PREPROCESS_THREADS = int(os.environ.get("PREPROCESS_THREADS", os.cpu_count() or 1))
+preprocess_pool = ThreadPoolExecutor(max_workers=PREPROCESS_THREADS, thread_name_prefix="preprocess")
+
+# /predict_batch requests streaming at once; more are refused with 503 so they cannot starve /predict
+BATCH_REQUESTS = int(os.environ.get("PREDICT_BATCH_CONCURRENCY", 2))
+batch_slots = threading.BoundedSemaphore(BATCH_REQUESTS)
+BATCH_TIMEOUT = 60.0  # seconds one /predict_batch chunk may wait for the batcher
+
+# Set by init_inference()
+model = None
+transform = None
+batcher = None
+imagenet_classes = []
+model_report = {}
+MODEL_VERSION = None
+startup = {"ready": False, "error": None, "timings_ms": {}}
+
+def load_labels():
+    """Reads ImageNet class labels once, downloading them if not present."""
+    if not os.path.exists(LABELS_PATH):
+        import requests
+
+        labels = requests.get(LABELS_URL).text.splitlines()
+        with open(LABELS_PATH, "w") as f:
+            f.write("\n".join(labels))
+        return labels
     with open(LABELS_PATH, "r") as f:
-        imagenet_classes = f.read().splitlines()
+        return [line.strip() for line in f.read().splitlines()]
 
 def load_model():
+    import torch
+    import torchvision.models as models
+
     model = models.mobilenet_v2(weights=None)  # Initialize model without weights
 
     if os.path.exists(MODEL_PATH):
@@ -39,33 +104,101 @@ def load_model():
     model.eval()  # Set to evaluation mode
     return model
 
-# Load the model
-model = load_model()
+def _timed(name, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    startup["timings_ms"][name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def init_inference():
+    """Loads labels, model and batcher, runs warmup, then marks the app ready."""
+    global model, transform, batcher, imagenet_classes, model_report, MODEL_VERSION
+
+    started = time.perf_counter()
+    try:
+        import torch
+        import torchvision.transforms as transforms
+        from batching import BatchScheduler
+        from worker_pool import InferenceWorkerPool
+        from model_variants import build_variant
+        startup["timings_ms"]["imports"] = round((time.perf_counter() - started) * 1000, 1)
+
+        # Define transformations
+        transform = transforms.Compose([
+            transforms.Resize(256),
+            transforms.CenterCrop(224),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
+
+        if MODEL_BUNDLE:
+            from model_bundle import load_bundle
+
+            loaded, imagenet_classes, manifest = _timed("bundle", load_bundle, MODEL_BUNDLE)
+            model_report = dict(manifest.get("report", {}), bundle=MODEL_BUNDLE)
+            MODEL_VERSION = f"{manifest['source_version']}:{manifest['backend']}"
+        else:
+            imagenet_classes = _timed("labels", load_labels)
+            fp32 = _timed("model", load_model)
+            # Convert the model to the selected inference backend
+            loaded, model_report = _timed("backend", build_variant, fp32, INFERENCE_BACKEND, MODEL_PATH,
+                                          transform=transform, calibration_dir=CALIBRATION_DIR)
+            MODEL_VERSION = f"{model_version(MODEL_PATH)}:{INFERENCE_BACKEND}"
+
+        if INFERENCE_WORKERS > 0:
+            new_batcher = _timed("workers", InferenceWorkerPool, loaded, num_workers=INFERENCE_WORKERS,
+                                 max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+        else:
+            new_batcher = BatchScheduler(loaded, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
 
-# Define transformations
-transform = transforms.Compose([
-    transforms.Resize(256),
-    transforms.CenterCrop(224),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-])
+        def warmup():
+            # First calls pay for allocator growth and (for TorchScript) graph optimization
+            with torch.no_grad():
+                loaded(torch.zeros(MAX_BATCH_SIZE, 3, 224, 224))
+            for _ in range(WARMUP_RUNS):
+                new_batcher.predict(torch.zeros(3, 224, 224))
+        _timed("warmup", warmup)
+
+        model, batcher = loaded, new_batcher
+        startup["timings_ms"]["total"] = round((time.perf_counter() - started) * 1000, 1)
+        startup["ready"] = True
+        logging.info("Classifier ready: %s", startup["timings_ms"])
+    except Exception as e:
+        startup["error"] = str(e)
+        logging.exception("Classifier startup failed")
+        raise
+
+if INIT_IN_BACKGROUND:
+    threading.Thread(target=init_inference, name="init-inference", daemon=True).start()
+else:
+    init_inference()
+
+@app.before_request
+def require_ready():
+    # Only inference endpoints wait for the model; pages and probes answer immediately
+    if not startup["ready"] and request.endpoint in ('predict', 'predict_batch', 'batch_stats'):
+        return jsonify({'error': 'Model is still loading', 'startup': startup}), 503, {'Retry-After': '1'}
 
 def predict_image(image):
     """Predicts the class of an image using MobileNetV2."""
+    started = time.perf_counter()
     image = transform(image)
-    image = image.unsqueeze(0)  # Add batch dimension
+    transformed = time.perf_counter()
 
-    with torch.no_grad():
-        outputs = model(image)
-        _, predicted_idx = torch.max(outputs, 1)
+    # The batcher stacks concurrent requests and returns this image's logits
+    outputs = batcher.predict(image)
+    forwarded = time.perf_counter()
 
-    # Load ImageNet class labels from the correct file
-    with open(LABELS_PATH, "r") as f:
-        class_names = [line.strip() for line in f.readlines()]
+    # ImageNet class labels are loaded once at startup
+    predicted_idx = outputs.argmax().item()
+    predicted_class_name = imagenet_classes[predicted_idx]
+    stage_timer.record({
+        "transform": (transformed - started) * 1000,
+        "forward": (forwarded - transformed) * 1000,
+        "postprocess": (time.perf_counter() - forwarded) * 1000,
+    })
 
-    predicted_class_name = class_names[predicted_idx.item()]
-    
-    return predicted_class_name, predicted_idx.item()
+    return predicted_class_name, predicted_idx
 
 @app.route('/')
 def index():
@@ -78,16 +211,101 @@ def predict():
 
     image_file = request.files['image']
     try:
-        image = Image.open(image_file).convert('RGB')
-        predicted_class_name, predicted_class_idx = predict_image(image)  # Fixed unpacking
+        data = image_file.read()
+        cache_key = prediction_cache.key(data, MODEL_VERSION)
+        result = prediction_cache.get(cache_key)
+        if result is None:
+            image, decode_info = decode_image(data, 256, max_pixels=MAX_INPUT_PIXELS,
+                                              reduced=REDUCED_DECODE)
+            stage_timer.record(decode_info["timings_ms"])
+            predicted_class_name, predicted_class_idx = predict_image(image)  # Fixed unpacking
+            result = {
+                'predicted_class': predicted_class_name,
+                'predicted_index': predicted_class_idx
+            }
+            prediction_cache.put(cache_key, result)
 
-        return jsonify({
-            'predicted_class': predicted_class_name,
-            'predicted_index': predicted_class_idx
-        })
+        return jsonify(result)
 
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def forward_via_batcher(batch):
+    """Runs a stacked batch through the shared batcher, so /predict_batch uses the
+    same scheduler or worker pool (and batching limits) as /predict."""
+    import torch
+
+    futures = [batcher.submit(tensor) for tensor in batch]
+    return torch.stack([future.result(timeout=BATCH_TIMEOUT) for future in futures])
+
+def preprocess_bytes(data):
+    image, decode_info = decode_image(data, 256, max_pixels=MAX_INPUT_PIXELS, reduced=REDUCED_DECODE)
+    started = time.perf_counter()
+    tensor = transform(image)
+    stage_timer.record({**decode_info["timings_ms"], "transform": (time.perf_counter() - started) * 1000})
+    return tensor
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Classifies many images per request and streams NDJSON results.
+
+    Accepts any number of `images` files and/or `archive` files (zip or tar).
+    Query params: top_k (default 5), batch_size (default 32). Forward passes
+    go through the shared batcher; at most PREDICT_BATCH_CONCURRENCY requests
+    stream at once and the rest get 503 with Retry-After.
+    """
+    from batch_inputs import MAX_TOP_K, iter_archive, run_batches
+
+    if 'images' not in request.files and 'archive' not in request.files:
+        return jsonify({'error': 'No images or archive uploaded'}), 400
+    if not batch_slots.acquire(blocking=False):
+        return jsonify({'error': 'Server is busy, retry later'}), 503, {'Retry-After': '1'}
+    k = max(1, min(request.args.get('top_k', 5, type=int), MAX_TOP_K))
+    batch_size = max(1, min(request.args.get('batch_size', 32, type=int), 256))
+
+    def items():
+        for f in request.files.getlist('images'):
+            yield f.filename, f.read()
+        for f in request.files.getlist('archive'):
+            yield from iter_archive(f.stream, f.filename)
+
+    def generate():
+        try:
+            yield from run_batches(items(), preprocess_bytes, forward_via_batcher, preprocess_pool,
+                                   batch_size=batch_size, k=k, labels=imagenet_classes)
+        except ValueError as e:
+            yield json.dumps({'error': str(e)}) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(batch_slots.release)  # Also runs if the client leaves before streaming starts
+    return response
+
+@app.route('/health')
+def health():
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready')
+def ready():
+    status = 200 if startup['ready'] else 503
+    return jsonify(startup), status
+
+@app.route('/batch_stats')
+def batch_stats():
+    return jsonify(batcher.stats())
+
+@app.route('/preprocess_stats')
+def preprocess_stats():
+    return jsonify({'reduced_decode': REDUCED_DECODE, 'stages': stage_timer.stats()})
+
+@app.route('/model_info')
+def model_info():
+    return jsonify(model_report)
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
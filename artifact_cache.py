@@ -0,0 +1,218 @@
+import hashlib
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+
+CHUNK_SIZE = 8 * 1024 * 1024  # 8 MiB per streamed chunk
+
+
+def file_md5(path, chunk_size=CHUNK_SIZE):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactSource(ABC):
+    """Where a model artifact comes from.
+
+    describe() returns a dict with "size" and, when the source knows them,
+    "md5" and/or "etag". fetch(offset) yields the artifact bytes starting at
+    `offset` in chunks; sources that cannot seek must raise
+    RangeNotSupported when offset > 0.
+    """
+
+    @abstractmethod
+    def describe(self):
+        ...
+
+    @abstractmethod
+    def fetch(self, offset=0):
+        ...
+
+
+class RangeNotSupported(Exception):
+    """The source ignored a ranged request; the download must restart at 0."""
+
+
+class LocalDirSource(ArtifactSource):
+    """Serves an artifact from a local directory (stand-in for Drive in tests)."""
+
+    def __init__(self, directory, name):
+        self.path = os.path.join(directory, name)
+
+    def describe(self):
+        st = os.stat(self.path)
+        return {"size": st.st_size, "md5": file_md5(self.path), "etag": f"{st.st_size}-{int(st.st_mtime)}"}
+
+    def fetch(self, offset=0):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield chunk
+
+
+class HttpSource(ArtifactSource):
+    """Downloads an artifact over HTTP(S) using Range requests to resume."""
+
+    def __init__(self, url, session=None, md5=None):
+        import requests
+
+        self.url = url
+        self.session = session or requests.Session()
+        self.md5 = md5
+
+    def describe(self):
+        resp = self.session.head(self.url, allow_redirects=True)
+        resp.raise_for_status()
+        size = resp.headers.get("Content-Length")
+        return {
+            "size": int(size) if size is not None else None,
+            "md5": self.md5,
+            "etag": resp.headers.get("ETag"),
+        }
+
+    def _get(self, offset):
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        return self.session.get(self.url, headers=headers, stream=True)
+
+    def fetch(self, offset=0):
+        with self._get(offset) as resp:
+            resp.raise_for_status()
+            if offset and resp.status_code != 206:
+                raise RangeNotSupported(self.url)
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    yield chunk
+
+
+class DriveSource(HttpSource):
+    """Google Drive file: metadata from the Drive API, bytes via ranged alt=media GETs."""
+
+    SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+
+    def __init__(self, credentials, file_id):
+        from google.auth.transport.requests import AuthorizedSession
+
+        creds = credentials.with_scopes(self.SCOPES) if hasattr(credentials, "with_scopes") else credentials
+        super().__init__(
+            f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media",
+            session=AuthorizedSession(creds),
+        )
+        self.file_id = file_id
+
+    def describe(self):
+        resp = self.session.get(
+            f"https://www.googleapis.com/drive/v3/files/{self.file_id}",
+            params={"fields": "size,md5Checksum,modifiedTime"},
+        )
+        resp.raise_for_status()
+        meta = resp.json()
+        return {
+            "size": int(meta["size"]) if "size" in meta else None,
+            "md5": meta.get("md5Checksum"),
+            "etag": meta.get("modifiedTime"),
+        }
+
+
+class ArtifactCache:
+    """Streams an artifact to disk, verifies it, resumes partial downloads
+    and skips the download when the local copy already matches the source.
+
+    For `dest`, the cache keeps:
+      dest            verified artifact
+      dest.meta.json  source metadata the artifact was verified against
+      dest.part       in-progress download
+      dest.part.json  source metadata the partial download belongs to
+    """
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.meta_path = dest + ".meta.json"
+        self.part_path = dest + ".part"
+        self.part_meta_path = dest + ".part.json"
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    @staticmethod
+    def _same_version(a, b):
+        if not a or not b:
+            return False
+        if a.get("md5") and b.get("md5"):
+            return a["md5"] == b["md5"]
+        return a.get("etag") is not None and a.get("etag") == b.get("etag") and a.get("size") == b.get("size")
+
+    def is_current(self, remote):
+        """True when dest exists and was verified against the same remote version."""
+        if not os.path.exists(self.dest):
+            return False
+        local = self._read_json(self.meta_path)
+        if not self._same_version(local, remote):
+            return False
+        return remote.get("size") is None or os.path.getsize(self.dest) == remote["size"]
+
+    def fetch(self, source, progress=None):
+        """Makes dest match `source`, downloading only what is missing. Returns dest."""
+        remote = source.describe()
+        if self.is_current(remote):
+            logging.info("Artifact %s is up to date, skipping download", self.dest)
+            return self.dest
+
+        os.makedirs(os.path.dirname(self.dest) or ".", exist_ok=True)
+        offset = 0
+        if os.path.exists(self.part_path) and self._same_version(self._read_json(self.part_meta_path), remote):
+            offset = os.path.getsize(self.part_path)
+        else:
+            self._write_json(self.part_meta_path, remote)
+            open(self.part_path, "wb").close()
+
+        try:
+            self._download(source, remote, offset, progress)
+        except RangeNotSupported:
+            logging.info("Source does not support resume, restarting download")
+            open(self.part_path, "wb").close()
+            self._download(source, remote, 0, progress)
+
+        self._verify(remote)
+        os.replace(self.part_path, self.dest)
+        self._write_json(self.meta_path, remote)
+        os.remove(self.part_meta_path)
+        return self.dest
+
+    def _download(self, source, remote, offset, progress):
+        if offset:
+            logging.info("Resuming download of %s at byte %d", self.dest, offset)
+        total = remote.get("size")
+        if total is not None and offset >= total:
+            return
+        written = offset
+        with open(self.part_path, "ab") as f:
+            for chunk in source.fetch(offset):
+                f.write(chunk)
+                written += len(chunk)
+                if progress:
+                    progress(written, total)
+
+    def _verify(self, remote):
+        size = os.path.getsize(self.part_path)
+        if remote.get("size") is not None and size != remote["size"]:
+            raise IOError(f"Downloaded {size} bytes, expected {remote['size']}")
+        if remote.get("md5"):
+            md5 = file_md5(self.part_path)
+            if md5 != remote["md5"]:
+                # Corrupt partial data must not be resumed from
+                os.remove(self.part_path)
+                raise IOError(f"Checksum mismatch for {self.dest}: got {md5}, expected {remote['md5']}")
@@ -0,0 +1,239 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque, namedtuple
+
+# One monitoring sample fed to a policy; latency_ms is optional (None when unknown)
+Observation = namedtuple("Observation", ["timestamp", "cpu", "ram", "latency_ms"], defaults=[None])
+
+# What a policy wants: +n scale out, -n scale in, 0 hold
+Decision = namedtuple("Decision", ["delta", "reason"])
+HOLD = Decision(0, "")
+
+
+class ScalingPolicy(ABC):
+    """Base class for autoscaling strategies.
+
+    Policies are fed observations in time order and answer with a Decision.
+    The base class enforces the fleet size limits and a cooldown after every
+    scale event, so strategies only decide the direction.
+    """
+
+    name = "base"
+
+    def __init__(self, min_instances=1, max_instances=5, cooldown=300, scale_in_cooldown=None):
+        self.min_instances = min_instances
+        self.max_instances = max_instances
+        self.cooldown = cooldown
+        self.scale_in_cooldown = cooldown if scale_in_cooldown is None else scale_in_cooldown
+        self.last_scale_at = None
+        self.last_decision = HOLD
+
+    @abstractmethod
+    def propose(self, obs, instances):
+        """Strategy hook: returns a Decision ignoring limits and cooldown."""
+
+    def decide(self, obs, instances):
+        decision = self.propose(obs, instances)
+        if decision.delta == 0:
+            self.last_decision = decision
+            return decision
+
+        wait = self.cooldown if decision.delta > 0 else self.scale_in_cooldown
+        if self.last_scale_at is not None and obs.timestamp - self.last_scale_at < wait:
+            return HOLD
+
+        target = max(self.min_instances, min(self.max_instances, instances + decision.delta))
+        if target == instances:
+            return HOLD
+        self.last_scale_at = obs.timestamp
+        self.last_decision = Decision(target - instances, decision.reason)
+        return self.last_decision
+
+    def describe(self):
+        params = {k: v for k, v in vars(self).items() if not k.startswith(("_", "last_"))}
+        return {"policy": self.name, "params": params, "last_scale_at": self.last_scale_at,
+                "last_decision": self.last_decision._asdict()}
+
+
+class ThresholdPolicy(ScalingPolicy):
+    """Scale out after `sustain` seconds above `high`; scale in after
+    `sustain_in` seconds below `low` (the gap between them is the hysteresis).
+    Any of CPU, RAM (ram_high) or latency (latency_high) can trigger scale-out."""
+
+    name = "threshold"
+
+    def __init__(self, high=75, low=30, sustain=10, sustain_in=300, ram_high=None, latency_high=None, **kwargs):
+        super().__init__(**kwargs)
+        self.high = high
+        self.low = low
+        self.sustain = sustain
+        self.sustain_in = sustain_in
+        self.ram_high = ram_high
+        self.latency_high = latency_high
+        self._above_since = None
+        self._below_since = None
+
+    def _overloaded(self, obs):
+        if obs.cpu > self.high:
+            return f"cpu {obs.cpu:.1f} > {self.high}"
+        if self.ram_high is not None and obs.ram > self.ram_high:
+            return f"ram {obs.ram:.1f} > {self.ram_high}"
+        if self.latency_high is not None and obs.latency_ms is not None and obs.latency_ms > self.latency_high:
+            return f"latency {obs.latency_ms:.0f}ms > {self.latency_high}ms"
+        return None
+
+    def propose(self, obs, instances):
+        reason = self._overloaded(obs)
+        if reason:
+            self._below_since = None
+            if self._above_since is None:
+                self._above_since = obs.timestamp
+            if obs.timestamp - self._above_since >= self.sustain:
+                return Decision(1, f"{reason} for {obs.timestamp - self._above_since:.0f}s")
+            return HOLD
+
+        self._above_since = None
+        if obs.cpu < self.low:
+            if self._below_since is None:
+                self._below_since = obs.timestamp
+            if obs.timestamp - self._below_since >= self.sustain_in:
+                return Decision(-1, f"cpu < {self.low} for {obs.timestamp - self._below_since:.0f}s")
+        else:
+            self._below_since = None
+        return HOLD
+
+
+class EwmaPolicy(ScalingPolicy):
+    """Scale on an exponentially smoothed CPU signal, which ignores short spikes."""
+
+    name = "ewma"
+
+    def __init__(self, alpha=0.2, high=75, low=30, **kwargs):
+        super().__init__(**kwargs)
+        self.alpha = alpha
+        self.high = high
+        self.low = low
+        self._value = None
+
+    def propose(self, obs, instances):
+        value = obs.cpu if self._value is None else self.alpha * obs.cpu + (1 - self.alpha) * self._value
+        self._value = value
+        if value > self.high:
+            return Decision(1, f"ewma cpu {value:.1f} > {self.high}")
+        if value < self.low:
+            return Decision(-1, f"ewma cpu {value:.1f} < {self.low}")
+        return HOLD
+
+
+class TargetTrackingPolicy(ScalingPolicy):
+    """Sizes the fleet so average CPU per instance sits near `target`.
+
+    `cpu` is the per-instance utilization of the current fleet; the desired
+    size is ceil(instances * cpu / target), smoothed over `window` samples.
+    """
+
+    name = "target"
+
+    def __init__(self, target=60, window=6, tolerance=0.1, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target
+        self.window = window
+        self.tolerance = tolerance
+        self._recent = deque(maxlen=window)
+
+    def propose(self, obs, instances):
+        self._recent.append(obs.cpu)
+        avg = sum(self._recent) / len(self._recent)
+        if abs(avg - self.target) <= self.tolerance * self.target:
+            return HOLD
+        desired = max(1, math.ceil(instances * avg / self.target))
+        if desired != instances:
+            return Decision(desired - instances, f"avg cpu {avg:.1f} vs target {self.target}")
+        return HOLD
+
+
+class ForecastPolicy(ScalingPolicy):
+    """Fits a line to the last `window` seconds of CPU and scales if the value
+    forecast `horizon` seconds ahead crosses `high` (or falls below `low`).
+
+    The least-squares fit is kept as running sums over the window, so each
+    observation costs O(1). Times are relative to an origin that is moved
+    forward now and then, which keeps the sums small enough to stay exact.
+    """
+
+    name = "forecast"
+
+    def __init__(self, window=120, horizon=120, high=75, low=30, **kwargs):
+        super().__init__(**kwargs)
+        self.window = window
+        self.horizon = horizon
+        self.high = high
+        self.low = low
+        self._history = deque()
+        self._origin = None
+        self._sums = [0.0, 0.0, 0.0, 0.0]  # sum t, x, t*t, t*x with t relative to _origin
+
+    def _accumulate(self, timestamp, x, sign):
+        t = timestamp - self._origin
+        sums = self._sums
+        sums[0] += sign * t
+        sums[1] += sign * x
+        sums[2] += sign * t * t
+        sums[3] += sign * t * x
+
+    def _rebase(self):
+        self._origin = self._history[0][0]
+        self._sums = [0.0, 0.0, 0.0, 0.0]
+        for timestamp, x in self._history:
+            self._accumulate(timestamp, x, 1)
+
+    def forecast(self):
+        n = len(self._history)
+        if n < 3:
+            return None
+        sum_t, sum_x, sum_tt, sum_tx = self._sums
+        t_mean, x_mean = sum_t / n, sum_x / n
+        var = sum_tt - n * t_mean * t_mean
+        slope = 0.0 if var <= 1e-9 else (sum_tx - n * t_mean * x_mean) / var
+        return x_mean + slope * (self._history[-1][0] - self._origin + self.horizon - t_mean)
+
+    def propose(self, obs, instances):
+        if self._origin is None:
+            self._origin = obs.timestamp
+        self._history.append((obs.timestamp, obs.cpu))
+        self._accumulate(obs.timestamp, obs.cpu, 1)
+        while self._history and self._history[0][0] < obs.timestamp - self.window:
+            self._accumulate(*self._history.popleft(), -1)
+        if obs.timestamp - self._origin > 10 * self.window:
+            self._rebase()  # also clears the rounding left by the subtractions
+        predicted = self.forecast()
+        if predicted is None:
+            return HOLD
+        if predicted > self.high:
+            return Decision(1, f"forecast cpu {predicted:.1f} > {self.high} in {self.horizon}s")
+        if predicted < self.low and obs.cpu < self.low:
+            return Decision(-1, f"forecast cpu {predicted:.1f} < {self.low}")
+        return HOLD
+
+
+POLICIES = {cls.name: cls for cls in (ThresholdPolicy, EwmaPolicy, TargetTrackingPolicy, ForecastPolicy)}
+
+
+def parse_params(spec):
+    """Parses "high=80,alpha=0.3" into {"high": 80, "alpha": 0.3}."""
+    params = {}
+    for item in filter(None, (spec or "").split(",")):
+        key, _, value = item.partition("=")
+        value = value.strip()
+        if value.lower() in ("none", ""):
+            params[key.strip()] = None
+        else:
+            number = float(value)
+            params[key.strip()] = int(number) if number.is_integer() else number
+    return params
+
+
+def make_policy(name, **params):
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy {name!r}, expected one of {sorted(POLICIES)}")
+    return POLICIES[name](**params)
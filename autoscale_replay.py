@@ -0,0 +1,129 @@
+"""Replays recorded usage from system_usage.db through an autoscaling policy.
+
+The recording comes from a single host, so the simulator models load as
+spreading evenly: with N serving instances each sees cpu / N of the recorded
+load. New instances cost instance-minutes immediately but only take load after
+--boot-seconds. While no instance is serving (min_instances=0, or all still
+booting) the load is unserved and counts as saturated (100%).
+
+Examples:
+    python autoscale_replay.py --policy threshold
+    python autoscale_replay.py --policy ewma --param alpha=0.3,high=70 --from 1700000000
+    python autoscale_replay.py --policy forecast --param horizon=180 --events --out forecast.json
+"""
+import argparse
+import json
+import sys
+import time
+from collections import deque
+
+from autoscale_policy import POLICIES, Observation, make_policy, parse_params
+from metrics_writer import DB_PATH
+from sqlite_wal import connect
+
+MAX_GAP = 60  # seconds; longer gaps between samples (monitor down) are not counted
+
+
+def load_usage(conn, start=None, end=None):
+    """Yields (epoch, cpu, ram) rows in time order."""
+    sql = "SELECT timestamp, cpu_usage, ram_usage FROM usage WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp"
+    return conn.execute(sql, (start or 0, end or 2 ** 62))
+
+
+def simulate(policy, rows, threshold=75, initial_instances=1, boot_seconds=90, redistribute=True):
+    """Runs `policy` over (epoch, cpu, ram) rows and returns a report dict."""
+    instances = initial_instances   # provisioned (billed)
+    booting = deque()               # ready-at timestamps of instances still booting
+    events = []
+    instance_seconds = over_seconds = 0.0
+    peak = instances
+    first = last = None
+    count = 0
+
+    for ts, cpu, ram in rows:
+        count += 1
+        while booting and booting[0] <= ts:
+            booting.popleft()
+        serving = instances - len(booting)
+        if serving <= 0:
+            load = 100.0
+        else:
+            load = min(cpu * initial_instances / serving if redistribute else cpu, 100.0)
+
+        if last is not None:
+            dt = min(ts - last[0], MAX_GAP)
+            instance_seconds += dt * last[1]
+            if last[2] > threshold:
+                over_seconds += dt
+        first = ts if first is None else first
+
+        decision = policy.decide(Observation(ts, load, ram), instances)
+        if decision.delta > 0:
+            booting.extend([ts + boot_seconds] * decision.delta)
+        elif decision.delta < 0:
+            # Cancel booting instances first, then retire serving ones
+            for _ in range(-decision.delta):
+                if booting:
+                    booting.pop()
+        if decision.delta:
+            instances += decision.delta
+            peak = max(peak, instances)
+            events.append({"timestamp": ts, "delta": decision.delta, "instances": instances,
+                           "cpu": round(load, 1), "reason": decision.reason})
+        last = (ts, instances, load)
+
+    span = (last[0] - first) if count else 0
+    return {
+        "policy": policy.name,
+        "params": policy.describe()["params"],
+        "samples": count,
+        "span_seconds": span,
+        "scale_out_events": sum(1 for e in events if e["delta"] > 0),
+        "scale_in_events": sum(1 for e in events if e["delta"] < 0),
+        "seconds_over_threshold": round(over_seconds, 1),
+        "percent_over_threshold": round(100.0 * over_seconds / span, 2) if span else 0.0,
+        "instance_minutes": round(instance_seconds / 60, 1),
+        "peak_instances": peak,
+        "final_instances": instances,
+        "events": events,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="threshold")
+    parser.add_argument("--param", default="", help='Policy parameters, e.g. "high=80,cooldown=600"')
+    parser.add_argument("--from", dest="start", type=int, help="Start epoch (default: oldest row)")
+    parser.add_argument("--to", dest="end", type=int, help="End epoch (default: newest row)")
+    parser.add_argument("--threshold", type=float, default=75, help="CPU %% counted as time over threshold")
+    parser.add_argument("--instances", type=int, default=1, help="Fleet size the recording was taken with")
+    parser.add_argument("--boot-seconds", type=float, default=90, help="Delay before a new instance takes load")
+    parser.add_argument("--no-redistribute", action="store_true", help="Feed recorded CPU unchanged to the policy")
+    parser.add_argument("--events", action="store_true", help="Include every scale event (default: first 20)")
+    parser.add_argument("--out", help="Write JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    policy = make_policy(args.policy, **parse_params(args.param))
+    conn = connect(args.db)
+    started = time.perf_counter()
+    report = simulate(policy, load_usage(conn, args.start, args.end), args.threshold,
+                      args.instances, args.boot_seconds, not args.no_redistribute)
+    elapsed = time.perf_counter() - started
+    conn.close()
+
+    report["replay_seconds"] = round(elapsed, 3)
+    report["speedup"] = round(report["span_seconds"] / elapsed) if elapsed > 0 else None
+    if not args.events:
+        report["events"] = report["events"][:20]
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
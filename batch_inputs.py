@@ -0,0 +1,111 @@
+import json
+import tarfile
+import zipfile
+from itertools import islice
+
+import torch
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff")
+MAX_TOP_K = 20
+MAX_MEMBER_BYTES = 50 * 1024 * 1024  # largest image accepted from inside an archive, uncompressed
+
+
+def _read_member(stream, name, declared_size, max_bytes):
+    """Reads one archive member, refusing it once it exceeds max_bytes.
+
+    The declared size is checked first, then the read itself is bounded,
+    since a crafted archive can understate the size in its headers.
+    """
+    if declared_size > max_bytes:
+        raise ValueError(f"{name} is {declared_size} bytes uncompressed, over the {max_bytes} byte limit")
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"{name} expands beyond the {max_bytes} byte limit")
+    return data
+
+
+def iter_archive(fileobj, filename="", max_member_bytes=MAX_MEMBER_BYTES):
+    """Yields (name, bytes) for every image inside a zip or tar(.gz/.bz2/.xz) upload.
+
+    Raises ValueError for a member larger than `max_member_bytes` once
+    extracted, so a small compressed upload cannot expand without limit.
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    with zf.open(info) as member:
+                        yield info.filename, _read_member(member, info.filename, info.file_size, max_member_bytes)
+        return
+
+    fileobj.seek(0)
+    try:
+        # Stream mode reads members sequentially without building an index
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+            for member in tf:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield member.name, _read_member(tf.extractfile(member), member.name, member.size,
+                                                    max_member_bytes)
+    except tarfile.ReadError:
+        raise ValueError(f"{filename or 'archive'} is not a zip or tar archive")
+
+
+def iter_chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def top_k(probabilities, k, labels=None):
+    """Converts one row of softmax scores to [{"index", "label", "score"}, ...]."""
+    scores, indices = probabilities.topk(min(k, probabilities.numel()))
+    results = []
+    for score, idx in zip(scores.tolist(), indices.tolist()):
+        entry = {"index": idx, "score": round(score, 6)}
+        if labels is not None:
+            entry["label"] = labels[idx]
+        results.append(entry)
+    return results
+
+
+def run_batches(items, preprocess, model, executor, batch_size=32, k=5, labels=None):
+    """Classifies (name, bytes) items in fixed-size batches and yields NDJSON lines.
+
+    Preprocessing runs in parallel on `executor`, and the next batch is
+    preprocessed while the current one goes through the model. Images that
+    fail to decode produce an {"file", "error"} line instead of aborting
+    the whole request. Output order follows input order.
+    """
+    def submit(chunk):
+        return [(name, executor.submit(preprocess, data)) for name, data in chunk]
+
+    chunks = iter_chunks(items, batch_size)
+    first = next(chunks, None)
+    pending = submit(first) if first else None
+    while pending:
+        current = pending
+        following = next(chunks, None)
+        pending = submit(following) if following else None
+
+        tensors, rows = [], []
+        for name, future in current:
+            try:
+                tensors.append(future.result())
+                rows.append({"file": name})
+            except Exception as e:
+                rows.append({"file": name, "error": str(e)})
+
+        if tensors:
+            with torch.no_grad():
+                probabilities = torch.softmax(model(torch.stack(tensors)), dim=1)
+            good = iter(probabilities)
+            for row in rows:
+                if "error" not in row:
+                    row["top_k"] = top_k(next(good), k, labels)
+
+        for row in rows:
+            yield json.dumps(row) + "\n"
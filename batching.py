@@ -0,0 +1,96 @@
+import threading
+import queue
+import time
+from concurrent.futures import Future
+
+import torch
+
+# Default batching limits (override per scheduler)
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5
+
+
+class BatchScheduler:
+    """Collects concurrent inference requests into one batched forward pass.
+
+    Callers submit a single preprocessed image tensor (C, H, W) and get back a
+    Future that resolves to that image's row of the model output.
+    """
+
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = {}  # batch size -> count
+        self._batches = 0
+        self._requests = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, tensor):
+        """Queues one image tensor and returns a Future for its output row."""
+        future = Future()
+        self._queue.put((tensor, future, time.perf_counter()))
+        return future
+
+    def predict(self, tensor, timeout=None):
+        """Blocking helper: submits one tensor and waits for its output row."""
+        return self.submit(tensor).result(timeout=timeout)
+
+    def _collect(self):
+        """Blocks for the first item, then gathers more until full or max_wait expires."""
+        items = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            started = time.perf_counter()
+            futures = [f for _, f, _ in items]
+            try:
+                batch = torch.stack([t for t, _, _ in items])
+                with torch.no_grad():
+                    outputs = self.model(batch)
+                for future, row in zip(futures, outputs):
+                    future.set_result(row)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            self._record(len(items), [started - enqueued for _, _, enqueued in items])
+
+    def _record(self, size, waits):
+        with self._lock:
+            self._batches += 1
+            self._requests += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._total_wait += sum(waits)
+            self._max_wait_seen = max(self._max_wait_seen, max(waits))
+
+    def stats(self):
+        """Returns queue depth, batch size histogram and queue wait times."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "requests": self._requests,
+                "avg_batch_size": self._requests / self._batches if self._batches else 0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_wait_ms": self._total_wait / self._requests * 1000 if self._requests else 0,
+                "max_wait_ms_seen": self._max_wait_seen * 1000,
+            }
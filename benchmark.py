@@ -0,0 +1,268 @@
+"""Offline inference benchmark for the image classifiers.
+
+Examples:
+    python benchmark.py run --out base.json
+    python benchmark.py run --images samples/ --batch-sizes 1,8,32 --threads 1,2,4 --out new.json
+    python benchmark.py compare base.json new.json --threshold 0.10
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+# Benchmark-wide settings
+SYNTHETIC_SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def percentiles(samples_ms):
+    """Returns p50/p95/p99/mean (ms) of a list of samples."""
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 4),
+        "p50_ms": round(pick(0.50), 4),
+        "p95_ms": round(pick(0.95), 4),
+        "p99_ms": round(pick(0.99), 4),
+    }
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def synthetic_images(count, sizes=SYNTHETIC_SIZES, seed=0):
+    """Deterministic noise JPEGs in a few common upload sizes."""
+    from PIL import Image
+
+    images = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        bands = [Image.effect_noise((width, height), 32 + 8 * ((seed + i + b) % 4)) for b in range(3)]
+        buf = io.BytesIO()
+        Image.merge("RGB", bands).save(buf, format="JPEG", quality=90)
+        images.append((f"synthetic_{i}_{width}x{height}.jpg", buf.getvalue()))
+    return images
+
+
+def sample_images(directory, limit):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append((name, f.read()))
+        if len(images) >= limit:
+            break
+    return images
+
+
+def build_pipeline(name):
+    """Returns (transform, short_side) matching app.py or image_identification.py."""
+    from torchvision import transforms
+
+    if name == "app":
+        return transforms.Compose([
+            transforms.Resize(256),
+            transforms.CenterCrop(224),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        ]), 256
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize((0.4914, 0.4822, 0.4465), (0.2023, 0.1994, 0.2010)),
+    ]), 224
+
+
+def build_model(args, transform):
+    import torch
+    import torchvision.models as models
+
+    if args.model_file:
+        model = torch.load(args.model_file, map_location="cpu")
+    else:
+        # Random weights are fine for timing and keep the run network-free
+        model = models.mobilenet_v2(weights=None)
+        if args.weights and os.path.exists(args.weights):
+            model.load_state_dict(torch.load(args.weights, map_location="cpu"))
+    model.eval()
+    if args.backend != "eager":
+        from model_variants import build_variant
+
+        # Build in a scratch directory: the benchmark model may have random weights,
+        # and writing it next to model/mobilenet_v2.pth would let app.py serve it
+        with tempfile.TemporaryDirectory(prefix="benchmark-variant-") as scratch:
+            model, _ = build_variant(model, args.backend, os.path.join(scratch, "mobilenet_v2.pth"),
+                                     transform=transform)
+    return model
+
+
+def bench_preprocess(images, transform, short_side, reduced):
+    from preprocessing import decode_image
+
+    decode, transform_ms, tensors = [], [], []
+    for _, data in images:
+        started = time.perf_counter()
+        image, _ = decode_image(data, short_side, reduced=reduced)
+        decoded = time.perf_counter()
+        tensors.append(transform(image))
+        done = time.perf_counter()
+        decode.append((decoded - started) * 1000)
+        transform_ms.append((done - decoded) * 1000)
+    return {"decode": percentiles(decode), "transform": percentiles(transform_ms)}, tensors
+
+
+def bench_forward(model, tensors, batch_size, threads, iterations, warmup):
+    import torch
+
+    torch.set_num_threads(threads)
+    batch = torch.stack([tensors[i % len(tensors)] for i in range(batch_size)])
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(batch)
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            model(batch)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - started
+    result = {"batch_size": batch_size, "threads": threads}
+    result.update(percentiles(latencies))
+    result["images_per_sec"] = round(batch_size * iterations / elapsed, 2)
+    return result
+
+
+def run(args):
+    import torch
+
+    transform, short_side = build_pipeline(args.pipeline)
+    if args.images:
+        images = sample_images(args.images, args.count)
+    else:
+        images = synthetic_images(args.count)
+    if not images:
+        raise SystemExit("No images to benchmark")
+
+    model = build_model(args, transform)
+    stages, tensors = bench_preprocess(images, transform, short_side, not args.full_decode)
+
+    forward = []
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            result = bench_forward(model, tensors, batch_size, threads, args.iterations, args.warmup)
+            print(f"batch={batch_size:<4} threads={threads:<3} p50={result['p50_ms']:.2f}ms "
+                  f"p99={result['p99_ms']:.2f}ms {result['images_per_sec']:.1f} img/s", file=sys.stderr)
+            forward.append(result)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "machine": platform.machine(),
+            "pipeline": args.pipeline,
+            "backend": args.backend,
+            "reduced_decode": not args.full_decode,
+            "images": "synthetic" if not args.images else args.images,
+            "image_count": len(images),
+        },
+        "stages": stages,
+        "forward": forward,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(base, new, threshold):
+    """Returns a list of regressions (latency up or throughput down by more than threshold)."""
+    regressions = []
+
+    def check(name, old, cur, higher_is_worse=True):
+        if not old or cur is None:
+            return
+        change = (cur - old) / old
+        if (change > threshold) if higher_is_worse else (change < -threshold):
+            regressions.append({"metric": name, "base": old, "new": cur, "change": round(change, 4)})
+
+    for stage in ("decode", "transform"):
+        for q in ("p50_ms", "p95_ms", "p99_ms"):
+            check(f"{stage}.{q}", base["stages"][stage].get(q), new["stages"][stage].get(q))
+
+    base_forward = {(r["batch_size"], r["threads"]): r for r in base["forward"]}
+    for r in new["forward"]:
+        old = base_forward.get((r["batch_size"], r["threads"]))
+        if old is None:
+            continue
+        label = f"forward[batch={r['batch_size']},threads={r['threads']}]"
+        for q in ("p50_ms", "p95_ms", "p99_ms"):
+            check(f"{label}.{q}", old.get(q), r.get(q))
+        check(f"{label}.images_per_sec", old["images_per_sec"], r["images_per_sec"], higher_is_worse=False)
+
+    check("peak_rss_mb", base.get("peak_rss_mb"), new.get("peak_rss_mb"))
+    return regressions
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmark and write JSON results")
+    run_parser.add_argument("--pipeline", choices=("app", "image_identification"), default="app")
+    run_parser.add_argument("--backend", default="eager",
+                            help="eager, torchscript, dynamic_int8 or static_int8 (see model_variants.py)")
+    run_parser.add_argument("--weights", help="state_dict for mobilenet_v2 (default: random weights)")
+    run_parser.add_argument("--model-file", help="Pickled full model, as image_identification.py loads")
+    run_parser.add_argument("--images", help="Directory of sample images (default: synthetic)")
+    run_parser.add_argument("--count", type=int, default=32, help="Number of images to preprocess")
+    run_parser.add_argument("--full-decode", action="store_true", help="Disable reduced-resolution decode")
+    run_parser.add_argument("--batch-sizes", type=int_list, default=[1, 8, 32])
+    run_parser.add_argument("--threads", type=int_list, default=[1, os.cpu_count() or 1])
+    run_parser.add_argument("--iterations", type=int, default=20)
+    run_parser.add_argument("--warmup", type=int, default=3)
+    run_parser.add_argument("--out", help="Write JSON here (default: stdout)")
+
+    cmp_parser = sub.add_parser("compare", help="Compare two runs and flag regressions")
+    cmp_parser.add_argument("base")
+    cmp_parser.add_argument("new")
+    cmp_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative change (0.10 = 10%%)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = run(args)
+        text = json.dumps(results, indent=2)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(text)
+        else:
+            print(text)
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(base, new, args.threshold)
+    print(json.dumps({"threshold": args.threshold, "regressions": regressions}, indent=2))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
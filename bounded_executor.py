@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """Raised when the executor's queue is full; callers should answer 503."""
+
+    def __init__(self, retry_after):
+        super().__init__("Server is busy, retry later")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """Runs blocking (CPU-bound) work off the event loop with backpressure.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more may
+    wait; anything beyond that is rejected immediately with Overloaded
+    instead of piling up behind the slow requests.
+    """
+
+    def __init__(self, max_workers, max_queue, retry_after=1, name="worker"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def submit(self, fn, *args):
+        """Admits fn(*args) now, or raises Overloaded; returns an asyncio future for its result.
+
+        Lets a caller learn whether the job was admitted before awaiting it
+        (e.g. to answer 503 before a streaming response starts).
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(self.retry_after)
+        with self._lock:
+            self._in_flight += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) in the pool and awaits its result, or raises Overloaded."""
+        return await self.submit(fn, *args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
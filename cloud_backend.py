@@ -0,0 +1,348 @@
+import os
+import subprocess
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+
+# Settings of the autoscaled backend VMs
+PROJECT_ID = "project-1-autoscale-gcp-vm"
+ZONE = "us-central1-c"
+MACHINE_TYPE = "e2-medium"
+IMAGE_PROJECT = "ubuntu-os-cloud"
+IMAGE_FAMILY = "ubuntu-2004-lts"
+KEY_FILE = "/home/suvendu/VCC/VCC_m22aie218_assignment_1/project-1-autoscale-gcp-vm-e4be10f24915.json"
+NETWORK_TAG = "backend-server"
+FIREWALL_RULE = "allow-backend-5000"
+BACKEND_PORT = 5000
+
+STARTUP_SCRIPT = """#!/bin/bash
+sudo apt update
+sudo apt install -y docker.io
+sudo systemctl start docker
+sudo systemctl enable docker
+sudo docker pull suvendu2023/flask-news-ai
+sudo docker run -d -p 5000:5000 suvendu2023/flask-news-ai
+"""
+
+# For images baked from a configured instance: docker and the app image are
+# already on disk, so boot only (re)starts the container
+BAKED_STARTUP_SCRIPT = """#!/bin/bash
+sudo docker start flask-news-ai || sudo docker run -d --name flask-news-ai --restart always -p 5000:5000 suvendu2023/flask-news-ai
+"""
+
+
+class CloudError(Exception):
+    """A provider call failed; the provisioning job records the message."""
+
+
+class CloudBackend(ABC):
+    """Provider operations used by provisioning. All calls block and are
+    idempotent: repeating one that already took effect is a no-op, so a job
+    can simply be retried."""
+
+    @abstractmethod
+    def authenticate(self):
+        ...
+
+    @abstractmethod
+    def ensure_ssh_keys(self):
+        ...
+
+    @abstractmethod
+    def ensure_firewall_rule(self):
+        ...
+
+    @abstractmethod
+    def create_instance(self, name, tags=(NETWORK_TAG,), startup_script=STARTUP_SCRIPT, source_image=None):
+        """Creates the instance unless it already exists; returns once it is running.
+        `source_image` overrides the stock Ubuntu image (e.g. a baked image family)."""
+
+    @abstractmethod
+    def get_instance(self, name):
+        """Returns {"name", "status", ...} or None when the instance does not exist."""
+
+    @abstractmethod
+    def start_instance(self, name):
+        """Starts a stopped instance; returns once it is running."""
+
+    @abstractmethod
+    def stop_instance(self, name):
+        ...
+
+    @abstractmethod
+    def delete_instance(self, name):
+        """Deletes the instance; deleting one that is already gone is a no-op."""
+
+    @abstractmethod
+    def list_instances(self, prefixes):
+        """Returns [{"name", "status"}] for instances whose name starts with one of `prefixes`."""
+
+    @abstractmethod
+    def is_serving(self, name):
+        """True once the instance answers HTTP on BACKEND_PORT."""
+
+    @abstractmethod
+    def bake_image(self, source_instance, family):
+        """Creates an image in `family` from a configured instance's boot disk."""
+
+
+class GcpBackend(CloudBackend):
+    """Compute Engine through the compute_v1 SDK plus the gcloud CLI."""
+
+    def __init__(self, project=PROJECT_ID, zone=ZONE, machine_type=MACHINE_TYPE, key_file=None):
+        from google.cloud import compute_v1
+
+        self.compute_v1 = compute_v1
+        self.project = project
+        self.zone = zone
+        self.machine_type = machine_type
+        self.key_file = key_file or os.environ.get("GCP_KEY_FILE", KEY_FILE)
+        self._instances = None
+
+    @property
+    def instances(self):
+        if self._instances is None:
+            self._instances = self.compute_v1.InstancesClient()
+        return self._instances
+
+    def _gcloud(self, *args, check=True):
+        result = subprocess.run(["gcloud", *args], capture_output=True, text=True)
+        if check and result.returncode != 0:
+            raise CloudError(f"gcloud {' '.join(args[:3])} failed: {result.stderr.strip()}")
+        return result
+
+    def authenticate(self):
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.key_file
+        self._gcloud("auth", "activate-service-account", "--key-file", self.key_file)
+        self._gcloud("config", "set", "project", self.project)
+
+    def ensure_ssh_keys(self):
+        self._gcloud("compute", "project-info", "add-metadata",
+                     "--metadata-from-file", "ssh-keys=" + os.path.expanduser("~/.ssh/google_compute_engine.pub"))
+
+    def ensure_firewall_rule(self):
+        if self._gcloud("compute", "firewall-rules", "describe", FIREWALL_RULE, check=False).returncode == 0:
+            return
+        self._gcloud("compute", "firewall-rules", "create", FIREWALL_RULE,
+                     "--allow", f"tcp:{BACKEND_PORT}",
+                     "--source-ranges", "0.0.0.0/0",
+                     "--target-tags", NETWORK_TAG,
+                     "--description", f"Allow incoming traffic on port {BACKEND_PORT} for backend server")
+
+    def get_instance(self, name):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            instance = self.instances.get(project=self.project, zone=self.zone, instance=name)
+        except NotFound:
+            return None
+        interfaces = instance.network_interfaces
+        ip = interfaces[0].access_configs[0].nat_i_p if interfaces and interfaces[0].access_configs else None
+        return {"name": instance.name, "status": instance.status, "ip": ip}
+
+    def _wait(self, operation, what):
+        try:
+            operation.result()
+        except Exception as e:
+            raise CloudError(f"{what} failed: {e}") from e
+
+    def start_instance(self, name):
+        self._wait(self.instances.start(project=self.project, zone=self.zone, instance=name), f"Starting {name}")
+
+    def stop_instance(self, name):
+        self._wait(self.instances.stop(project=self.project, zone=self.zone, instance=name), f"Stopping {name}")
+
+    def delete_instance(self, name):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            operation = self.instances.delete(project=self.project, zone=self.zone, instance=name)
+        except NotFound:
+            return
+        self._wait(operation, f"Deleting {name}")
+
+    def list_instances(self, prefixes):
+        request = self.compute_v1.ListInstancesRequest(project=self.project, zone=self.zone)
+        return [
+            {"name": instance.name, "status": instance.status}
+            for instance in self.instances.list(request=request)
+            if instance.name.startswith(tuple(prefixes))
+        ]
+
+    def is_serving(self, name):
+        instance = self.get_instance(name)
+        if not instance or instance["status"] != "RUNNING" or not instance["ip"]:
+            return False
+        try:
+            with urllib.request.urlopen(f"http://{instance['ip']}:{BACKEND_PORT}/", timeout=2):
+                return True
+        except urllib.error.HTTPError:
+            return True  # Any HTTP answer means the container is up
+        except OSError:
+            return False
+
+    def bake_image(self, source_instance, family):
+        compute_v1 = self.compute_v1
+        image = compute_v1.Image(
+            name=f"{family}-{time.strftime('%Y%m%d%H%M%S')}",
+            family=family,
+            source_disk=f"zones/{self.zone}/disks/{source_instance}",
+        )
+        operation = compute_v1.ImagesClient().insert(project=self.project, image_resource=image)
+        self._wait(operation, f"Baking image from {source_instance}")
+        return f"projects/{self.project}/global/images/family/{family}"
+
+    def create_instance(self, name, tags=(NETWORK_TAG,), startup_script=STARTUP_SCRIPT, source_image=None):
+        if self.get_instance(name) is not None:
+            return
+        compute_v1 = self.compute_v1
+        instance = compute_v1.Instance()
+        instance.name = name
+        instance.machine_type = f"zones/{self.zone}/machineTypes/{self.machine_type}"
+        # Tags and startup script go into the insert itself instead of two follow-up gcloud calls
+        instance.tags = compute_v1.Tags(items=list(tags))
+        if startup_script:
+            instance.metadata = compute_v1.Metadata(items=[compute_v1.Items(key="startup-script", value=startup_script)])
+
+        disk = compute_v1.AttachedDisk()
+        disk.initialize_params = compute_v1.AttachedDiskInitializeParams(
+            source_image=source_image or f"projects/{IMAGE_PROJECT}/global/images/family/{IMAGE_FAMILY}"
+        )
+        disk.auto_delete = True
+        disk.boot = True
+        instance.disks = [disk]
+
+        network_interface = compute_v1.NetworkInterface()
+        network_interface.name = "global/networks/default"
+        network_interface.access_configs = [compute_v1.AccessConfig(name="External NAT", type_="ONE_TO_ONE_NAT")]
+        instance.network_interfaces = [network_interface]
+
+        try:
+            operation = self.instances.insert(project=self.project, zone=self.zone, instance_resource=instance)
+        except Exception as e:
+            raise CloudError(f"Creating {name} failed: {e}") from e
+        self._wait(operation, f"Creating {name}")
+
+
+class FakeBackend(CloudBackend):
+    """In-process stand-in for load-testing the provisioning flow locally.
+
+    Each call sleeps for its configured latency (scaled by `speed`) and
+    records how often it ran, so tests can check that one-time steps really
+    ran once. Instances from the stock image start serving `boot_cold`
+    seconds after every boot, restarts included, since STARTUP_SCRIPT reruns
+    apt and docker each time; instances from a baked image take
+    `boot_baked`. `fail` maps an operation name to a number of calls that
+    raise.
+    """
+
+    LATENCY = {"authenticate": 2.0, "ensure_ssh_keys": 3.0, "ensure_firewall_rule": 5.0,
+               "create_instance": 40.0, "get_instance": 0.2, "start_instance": 15.0, "stop_instance": 10.0,
+               "is_serving": 0.05, "delete_instance": 30.0, "list_instances": 1.0, "bake_image": 60.0, "boot_cold": 150.0, "boot_baked": 10.0}
+
+    def __init__(self, speed=1.0, latency=None, fail=None):
+        self.speed = speed
+        self.latency = {**self.LATENCY, **(latency or {})}
+        self.fail = dict(fail or {})
+        self.calls = {op: 0 for op in self.latency}
+        self.instances = {}
+        self.images = {}
+        self.firewall = False
+        self._lock = threading.Lock()
+
+    def _call(self, op):
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+            failing = self.fail.get(op, 0) > 0
+            if failing:
+                self.fail[op] -= 1
+        time.sleep(self.latency.get(op, 0.0) * self.speed)
+        if failing:
+            raise CloudError(f"fake {op} failure")
+
+    def _boot(self, instance):
+        boot = self.latency["boot_baked"] if instance["baked"] else self.latency["boot_cold"]
+        instance["status"] = "RUNNING"
+        instance["serving_at"] = time.time() + boot * self.speed
+
+    def authenticate(self):
+        self._call("authenticate")
+
+    def ensure_ssh_keys(self):
+        self._call("ensure_ssh_keys")
+
+    def ensure_firewall_rule(self):
+        self._call("ensure_firewall_rule")
+        self.firewall = True
+
+    def get_instance(self, name):
+        self._call("get_instance")
+        with self._lock:
+            instance = self.instances.get(name)
+            return dict(instance) if instance else None
+
+    def create_instance(self, name, tags=(NETWORK_TAG,), startup_script=STARTUP_SCRIPT, source_image=None):
+        with self._lock:
+            if name in self.instances:
+                return
+            self.instances[name] = {"name": name, "status": "PROVISIONING", "tags": list(tags),
+                                    "baked": source_image is not None, "serving_at": None}
+        try:
+            self._call("create_instance")
+        except CloudError:
+            with self._lock:
+                del self.instances[name]
+            raise
+        with self._lock:
+            self._boot(self.instances[name])
+
+    def start_instance(self, name):
+        self._call("start_instance")
+        with self._lock:
+            instance = self.instances.get(name)
+            if instance is None:
+                raise CloudError(f"No instance {name}")
+            if instance["status"] != "RUNNING":
+                self._boot(instance)
+
+    def stop_instance(self, name):
+        self._call("stop_instance")
+        with self._lock:
+            instance = self.instances.get(name)
+            if instance is None:
+                raise CloudError(f"No instance {name}")
+            instance["status"], instance["serving_at"] = "TERMINATED", None
+
+    def delete_instance(self, name):
+        self._call("delete_instance")
+        with self._lock:
+            self.instances.pop(name, None)
+
+    def list_instances(self, prefixes):
+        self._call("list_instances")
+        with self._lock:
+            return [{"name": i["name"], "status": i["status"]}
+                    for i in self.instances.values() if i["name"].startswith(tuple(prefixes))]
+
+    def is_serving(self, name):
+        self._call("is_serving")
+        with self._lock:
+            instance = self.instances.get(name)
+            return bool(instance and instance["serving_at"] and time.time() >= instance["serving_at"])
+
+    def bake_image(self, source_instance, family):
+        self._call("bake_image")
+        with self._lock:
+            self.images[family] = source_instance
+        return f"projects/fake/global/images/family/{family}"
+
+
+def backend_from_env():
+    """CLOUD_BACKEND=gcp (default) or fake; FAKE_CLOUD_SPEED scales the fake's latencies."""
+    kind = os.environ.get("CLOUD_BACKEND", "gcp")
+    if kind == "fake":
+        return FakeBackend(speed=float(os.environ.get("FAKE_CLOUD_SPEED", 1.0)))
+    if kind == "gcp":
+        return GcpBackend()
+    raise ValueError(f"Unknown CLOUD_BACKEND {kind!r}, expected gcp or fake")
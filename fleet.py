@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics_writer import DB_PATH
+from sqlite_wal import connect
+
+INSTANCE_PREFIXES = ("auto-scaled-instance-", "warm-pool-")
+ACTIVE_STATES = ("provisioning", "serving", "draining")
+HEALTH_INTERVAL = 30.0  # seconds between health checks of serving instances
+UNHEALTHY_AFTER = 3     # consecutive failed checks before an instance is marked unhealthy
+DRAIN_SECONDS = 60.0    # grace period for in-flight requests before deletion
+
+
+def init_fleet_schema(conn):
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS fleet (
+                name TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                source TEXT,
+                job_id TEXT,
+                launched_at REAL,
+                serving_at REAL,
+                deleted_at REAL,
+                last_health_at REAL,
+                healthy INTEGER,
+                failed_checks INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+
+class FleetRegistry:
+    """Persistent record of every instance the autoscaler launched.
+
+    States: provisioning -> serving -> draining -> deleted, plus warm (a warm
+    pool member), lost (gone at the provider without us deleting it) and
+    failed. Rows are mirrored in memory and read from there. Each change is
+    queued to a single writer thread as one small commit, so the event loop
+    never waits on the database lock the metrics writer also takes; the one
+    thread keeps the writes in order.
+    """
+
+    COLUMNS = ("name", "state", "source", "job_id", "launched_at", "serving_at", "deleted_at",
+               "last_health_at", "healthy", "failed_checks")
+
+    def __init__(self, db_path=DB_PATH):
+        self._conn = connect(db_path)
+        init_fleet_schema(self._conn)
+        self._lock = threading.Lock()
+        cursor = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM fleet")
+        self._rows = {row[0]: dict(zip(self.COLUMNS, row)) for row in cursor}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fleet-db")
+
+    def upsert(self, name, **fields):
+        with self._lock:
+            row = self._rows.setdefault(name, {c: None for c in self.COLUMNS} | {"name": name, "failed_checks": 0})
+            row.update(fields)
+            self._writer.submit(self._write, [row[c] for c in self.COLUMNS])
+            return dict(row)
+
+    def _write(self, values):
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in self.COLUMNS[1:])
+        try:
+            with self._conn:
+                self._conn.execute(
+                    f"INSERT INTO fleet ({', '.join(self.COLUMNS)}) VALUES ({placeholders}) "
+                    f"ON CONFLICT(name) DO UPDATE SET {updates}",
+                    values,
+                )
+        except sqlite3.Error as e:
+            logging.error("Fleet registry write for %s failed: %s", values[0], e)
+
+    def get(self, name):
+        row = self._rows.get(name)
+        return dict(row) if row else None
+
+    def instances(self, states=None):
+        return [dict(r) for r in self._rows.values() if states is None or r["state"] in states]
+
+    def count(self, states):
+        return sum(1 for r in self._rows.values() if r["state"] in states)
+
+    def close(self):
+        self._writer.shutdown(wait=True)  # flush queued writes
+        self._conn.close()
+
+
+class FleetManager:
+    """Scale-in, health checks and reconciliation for the registered fleet.
+
+    The fleet size counts this host plus serving and provisioning instances,
+    and is kept within [min_size, max_size]. Scale-in retires the most
+    recently launched serving instances: they are marked draining, given
+    `drain_seconds` for in-flight requests, then deleted. Instances whose
+    provisioning job failed are deleted straight away, and retried on every
+    health check until the delete succeeds.
+    """
+
+    def __init__(self, backend, registry, warm_pool=None, min_size=1, max_size=5,
+                 drain_seconds=DRAIN_SECONDS, health_interval=HEALTH_INTERVAL):
+        self.backend = backend
+        self.registry = registry
+        self.warm_pool = warm_pool
+        self.min_size = min_size
+        self.max_size = max_size
+        self.drain_seconds = drain_seconds
+        self.health_interval = health_interval
+        self.last_reconcile = None
+        self._tasks = set()
+        self._deleting = set()  # failed instances with a delete in progress
+        self._health_task = None
+
+    def size(self):
+        return 1 + self.registry.count(("provisioning", "serving"))
+
+    # --- lifecycle hooks from provisioning and the warm pool ---------------------------
+
+    def on_job_started(self, job):
+        self.registry.upsert(job.instance_name, state="provisioning", source=job.source, job_id=job.id,
+                             launched_at=job.created_at)
+
+    def on_job_succeeded(self, job):
+        self.registry.upsert(job.instance_name, state="serving", source=job.source, job_id=job.id,
+                             serving_at=job.serving_at, healthy=1, failed_checks=0)
+
+    def on_job_failed(self, job):
+        if self.registry.get(job.instance_name):
+            self.registry.upsert(job.instance_name, state="failed")
+            self._delete_failed(job.instance_name)
+
+    def on_warm_ready(self, name):
+        self.registry.upsert(name, state="warm", source="warm", launched_at=time.time())
+
+    # --- scale-in --------------------------------------------------------------------
+
+    def scale_in(self, count):
+        """Starts draining up to `count` instances; returns their names."""
+        count = min(count, self.size() - self.min_size)
+        serving = sorted(self.registry.instances(("serving",)), key=lambda r: r["serving_at"] or 0, reverse=True)
+        names = [r["name"] for r in serving[:max(count, 0)]]
+        for name in names:
+            self.registry.upsert(name, state="draining")
+            self._spawn(self._drain_and_delete(name))
+        return names
+
+    async def _drain_and_delete(self, name):
+        await asyncio.sleep(self.drain_seconds)
+        try:
+            await asyncio.to_thread(self.backend.delete_instance, name)
+            self.registry.upsert(name, state="deleted", deleted_at=time.time())
+            logging.info("Deleted instance %s", name)
+        except Exception as e:
+            # Stays draining; the next reconcile retries the delete
+            logging.error("Deleting %s failed: %s", name, e)
+
+    def _delete_failed(self, name):
+        if name not in self._deleting:
+            self._deleting.add(name)
+            self._spawn(self._delete_if_failed(name))
+
+    async def _delete_if_failed(self, name):
+        try:
+            row = self.registry.get(name)
+            if row is None or row["state"] != "failed":
+                return  # resubmitted (or already handled) in the meantime
+            await asyncio.to_thread(self.backend.delete_instance, name)
+            if self.registry.get(name)["state"] == "failed":
+                self.registry.upsert(name, state="deleted", deleted_at=time.time())
+            logging.info("Deleted failed instance %s", name)
+        except Exception as e:
+            # Stays failed; the health loop retries the delete
+            logging.error("Deleting failed instance %s failed: %s", name, e)
+        finally:
+            self._deleting.discard(name)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # --- health --------------------------------------------------------------------
+
+    def start(self):
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    def stop(self):
+        if self._health_task:
+            self._health_task.cancel()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for row in self.registry.instances(("failed",)):
+                self._delete_failed(row["name"])
+            for row in self.registry.instances(("serving",)):
+                try:
+                    ok = await asyncio.to_thread(self.backend.is_serving, row["name"])
+                except Exception:
+                    ok = False
+                failed = 0 if ok else row["failed_checks"] + 1
+                self.registry.upsert(row["name"], last_health_at=time.time(), failed_checks=failed,
+                                     healthy=int(failed < UNHEALTHY_AFTER))
+
+    # --- reconciliation ------------------------------------------------------------------
+
+    async def reconcile(self):
+        """Brings the registry in line with the provider's instance list.
+
+        Registered instances the provider no longer has become lost; unknown
+        autoscaler instances are adopted (warm-pool-* ones back into the warm
+        pool); interrupted drains are finished and failed instances deleted.
+        """
+        actual = {i["name"]: i for i in await asyncio.to_thread(self.backend.list_instances, INSTANCE_PREFIXES)}
+        report = {"lost": [], "adopted": [], "warm": [], "deleting": []}
+        now = time.time()
+
+        for row in self.registry.instances(ACTIVE_STATES + ("warm",)):
+            if row["name"] not in actual:
+                self.registry.upsert(row["name"], state="lost", deleted_at=now)
+                report["lost"].append(row["name"])
+
+        for name, instance in actual.items():
+            row = self.registry.get(name)
+            if name.startswith("warm-pool-") and (row is None or row["state"] == "warm"):
+                self.registry.upsert(name, state="warm", source="warm", launched_at=(row or {}).get("launched_at") or now)
+                if self.warm_pool is not None and name not in self.warm_pool.ready:
+                    self.warm_pool.ready.append(name)
+                report["warm"].append(name)
+            elif row is not None and row["state"] == "failed":
+                self._delete_failed(name)
+                report["deleting"].append(name)
+            elif row is None or row["state"] in ("lost", "provisioning"):
+                # Launched by an earlier run (or a job interrupted by a restart): count it as serving
+                self.registry.upsert(name, state="serving", source=(row or {}).get("source") or "adopted",
+                                     launched_at=(row or {}).get("launched_at") or now, serving_at=now,
+                                     deleted_at=None, failed_checks=0, healthy=None)
+                report["adopted"].append(name)
+            elif row["state"] in ("draining", "deleted"):
+                self.registry.upsert(name, state="draining")
+                self._spawn(self._drain_and_delete(name))
+                report["deleting"].append(name)
+
+        self.last_reconcile = {"at": now, **report}
+        return self.last_reconcile
+
+    def stats(self):
+        counts = {}
+        for row in self.registry.instances():
+            counts[row["state"]] = counts.get(row["state"], 0) + 1
+        return {"size": self.size(), "min_size": self.min_size, "max_size": self.max_size,
+                "states": counts, "last_reconcile": self.last_reconcile}
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import psutil
+
+from ring_buffer import MetricRingBuffer
+
+# Sampling interval per metric group (seconds); override with
+# HOST_METRICS="cpu:1,load:5,disk:1,net:1,procs:15" (interval 0 disables a group)
+DEFAULT_INTERVALS = {"cpu": 1.0, "load": 5.0, "disk": 1.0, "net": 1.0, "procs": 15.0}
+TOP_PROCESSES = 5
+BUFFER_SECONDS = 3600  # in-memory history per group
+CHUNK_SECONDS = 60     # samples are persisted as one columnar chunk per group per minute
+
+
+def parse_intervals(spec):
+    intervals = dict(DEFAULT_INTERVALS)
+    for item in filter(None, (spec or "").split(",")):
+        group, _, seconds = item.partition(":")
+        if group.strip() not in DEFAULT_INTERVALS:
+            raise ValueError(f"Unknown host metric group {group!r}")
+        intervals[group.strip()] = float(seconds)
+    return intervals
+
+
+class _RateCounter:
+    """Turns cumulative counters (bytes, ops) into per-second rates."""
+
+    def __init__(self):
+        self._last = None
+
+    def rates(self, now, counters):
+        last, self._last = self._last, (now, counters)
+        if last is None or now <= last[0]:
+            return None
+        dt = now - last[0]
+        return [max(0.0, (cur - prev) / dt) for cur, prev in zip(counters, last[1])]
+
+
+class HostMetricsCollector:
+    """Collects per-core CPU, load average, disk and network I/O rates and the
+    top-N processes, each group on its own interval.
+
+    Numeric groups live in a MetricRingBuffer each (columnar NumPy arrays) and
+    are handed to the metrics writer as one packed chunk per group every
+    CHUNK_SECONDS: int64 timestamps plus a float32 (columns x samples) block.
+    Top processes are kept as JSON since their columns vary per sample.
+    """
+
+    def __init__(self, writer=None, intervals=None, top_n=TOP_PROCESSES):
+        self.writer = writer
+        self.intervals = {g: s for g, s in (intervals or DEFAULT_INTERVALS).items() if s and s > 0}
+        self.top_n = top_n
+        self.ncpu = psutil.cpu_count() or 1
+        self.columns = {
+            "cpu": [f"cpu{i}" for i in range(self.ncpu)] + ["iowait"],
+            "load": ["load1", "load5", "load15"],
+            "disk": ["read_bps", "write_bps", "read_iops", "write_iops"],
+            "net": ["sent_bps", "recv_bps", "sent_pps", "recv_pps"],
+        }
+        self.buffers = {
+            group: MetricRingBuffer(names, capacity=max(1, int(BUFFER_SECONDS / self.intervals[group])))
+            for group, names in self.columns.items() if group in self.intervals
+        }
+        self.top_processes = []
+        self._procs_chunk = []
+        self._chunk_start = {group: None for group in self.intervals}
+        self._disk_rate = _RateCounter()
+        self._net_rate = _RateCounter()
+        self._cpu_seconds = 0.0  # time spent collecting, to report our own overhead
+        self._started = None
+        self._tasks = []
+
+    # --- collection ---------------------------------------------------------------
+
+    def _collect_cpu(self, now):
+        per_core = psutil.cpu_times_percent(interval=None, percpu=True)
+        busy = [100.0 - c.idle - getattr(c, "iowait", 0.0) for c in per_core]
+        iowait = sum(getattr(c, "iowait", 0.0) for c in per_core) / len(per_core)
+        return busy[:self.ncpu] + [0.0] * (self.ncpu - len(busy)) + [iowait]
+
+    def _collect_load(self, now):
+        return list(os.getloadavg()) if hasattr(os, "getloadavg") else list(psutil.getloadavg())
+
+    def _collect_disk(self, now):
+        io = psutil.disk_io_counters()
+        if io is None:
+            return None
+        return self._disk_rate.rates(now, (io.read_bytes, io.write_bytes, io.read_count, io.write_count))
+
+    def _collect_net(self, now):
+        io = psutil.net_io_counters()
+        return self._net_rate.rates(now, (io.bytes_sent, io.bytes_recv, io.packets_sent, io.packets_recv))
+
+    def _collect_procs(self):
+        started = time.thread_time()
+        procs = []
+        for p in psutil.process_iter(["pid", "name", "cpu_percent", "memory_info"]):
+            info = p.info
+            if info["cpu_percent"] is None or info["memory_info"] is None:
+                continue
+            procs.append((info["cpu_percent"], info["pid"], info["name"], info["memory_info"].rss))
+        procs.sort(reverse=True)
+        self._cpu_seconds += time.thread_time() - started
+        return [
+            {"pid": pid, "name": name, "cpu_percent": cpu, "rss_mb": round(rss / 1048576, 1)}
+            for cpu, pid, name, rss in procs[:self.top_n]
+        ]
+
+    def sample(self, group, now=None):
+        """Collects one sample for a numeric group into its ring buffer."""
+        now = now if now is not None else time.time()
+        started = time.thread_time()
+        values = getattr(self, f"_collect_{group}")(now)
+        if values is not None:
+            self.buffers[group].append(int(now), values)
+            if self._chunk_start[group] is None:
+                self._chunk_start[group] = int(now)
+        self._cpu_seconds += time.thread_time() - started
+
+    async def _run_group(self, group):
+        interval = self.intervals[group]
+        if group == "cpu":
+            psutil.cpu_times_percent(interval=None, percpu=True)  # Prime the per-core counters
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if group == "procs":
+                    # Walking /proc for every process is the one costly group; keep it off the loop
+                    self.top_processes = await asyncio.to_thread(self._collect_procs)
+                    self._procs_chunk.append([int(time.time()), self.top_processes])
+                else:
+                    self.sample(group)
+                self._maybe_persist(group)
+            except Exception as e:
+                logging.error("Host metrics group %s failed: %s", group, e)
+
+    def start(self):
+        self._started = time.time()
+        for group in self.intervals:
+            self._tasks.append(asyncio.create_task(self._run_group(group)))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for group in self.intervals:
+            self._maybe_persist(group, force=True)
+
+    # --- persistence ----------------------------------------------------------------
+
+    def _maybe_persist(self, group, force=False):
+        if self.writer is None:
+            return
+        if group == "procs":
+            if self._procs_chunk and (force or self._procs_chunk[-1][0] - self._procs_chunk[0][0] >= CHUNK_SECONDS):
+                chunk, self._procs_chunk = self._procs_chunk, []
+                self.writer.add_host_chunk(group, chunk[0][0], chunk[-1][0], len(chunk), ["top_processes"],
+                                           None, json.dumps(chunk).encode(), "json")
+            return
+
+        start = self._chunk_start[group]
+        if start is None:
+            return
+        buffer = self.buffers[group]
+        if not force and buffer.latest_timestamp() - start < CHUNK_SECONDS:
+            return
+        timestamps, values = buffer.since(start)
+        self._chunk_start[group] = None
+        if timestamps.size == 0:
+            return
+        self.writer.add_host_chunk(
+            group, int(timestamps[0]), int(timestamps[-1]), int(timestamps.size), self.columns[group],
+            timestamps.astype("<i8").tobytes(), values.astype("<f4").tobytes(), "f32",
+        )
+
+    # --- queries --------------------------------------------------------------------
+
+    def overhead_percent(self):
+        """Collector CPU time as a percentage of one core since start."""
+        if not self._started:
+            return 0.0
+        elapsed = time.time() - self._started
+        return round(100.0 * self._cpu_seconds / elapsed, 4) if elapsed > 0 else 0.0
+
+    def latest(self):
+        result = {"intervals": self.intervals, "overhead_percent_of_core": self.overhead_percent()}
+        for group, buffer in self.buffers.items():
+            timestamps, values = buffer.last(1)
+            result[group] = None if timestamps.size == 0 else {
+                "timestamp": int(timestamps[0]),
+                **{name: round(float(v), 3) for name, v in zip(self.columns[group], values[:, 0])},
+            }
+        if "procs" in self.intervals:
+            result["procs"] = self.top_processes
+        return result
+
+    def window(self, group, seconds):
+        """Returns one group's samples over the last `seconds` as columns."""
+        buffer = self.buffers[group]
+        if not len(buffer):
+            return {"group": group, "columns": self.columns[group], "timestamps": [], "values": []}
+        timestamps, values = buffer.since(buffer.latest_timestamp() - seconds)
+        return {
+            "group": group,
+            "columns": self.columns[group],
+            "timestamps": timestamps.tolist(),
+            "values": np.round(values, 3).tolist(),
+        }
+
+
+def decode_chunk(columns, timestamps_blob, values_blob, encoding):
+    """Inverse of the packing in HostMetricsCollector: returns (columns, timestamps, values)."""
+    columns = json.loads(columns)
+    if encoding == "json":
+        return columns, None, json.loads(values_blob)
+    timestamps = np.frombuffer(timestamps_blob, dtype="<i8")
+    values = np.frombuffer(values_blob, dtype="<f4").reshape(len(columns), timestamps.size)
+    return columns, timestamps, values
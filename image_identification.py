@@ -1,17 +1,28 @@
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
-from googleapiclient import discovery
-from googleapiclient.http import MediaIoBaseDownload
+from fastapi import FastAPI, File, Query, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import json
 from google.oauth2 import service_account
 import io
 import os
+import queue
+import threading
+import time
 import torch  # Changed from tensorflow
 from PIL import Image
 import numpy as np
 import logging
 from torchvision import transforms  # PyTorch image transforms
+from prediction_cache import cache_from_env, model_version
+from preprocessing import ImageTooLarge, StageTimer, decode_image
+from instrumentation import instrument_fastapi, observe_stage
+from bounded_executor import BoundedExecutor, Overloaded
+from batch_inputs import MAX_TOP_K, iter_archive, run_batches
+from artifact_cache import ArtifactCache, DriveSource, HttpSource, LocalDirSource
 
 app = FastAPI()
+instrument_fastapi(app)  # GET /metrics: per-route latency, in-flight requests, inference stages, loop lag
 
 # Configuration (Replace with your values)
 #"https://drive.google.com/file/d/1-JWQ0SmgvJD8GC3kT3j_5L78T-tdPDrM/view?usp=drive_link"
@@ -22,75 +33,119 @@ MODEL_LOCAL_PATH = "model"
 
 # Global variables
 model = None
-drive_service = None
+model_version_tag = None
+
+# Cache results by upload content so repeat images skip decode and inference
+prediction_cache = cache_from_env()
+
+# Preprocessing pipeline, built once (adjust as needed for your model)
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize((0.4914, 0.4822, 0.4465), (0.2023, 0.1994, 0.2010))  # Example normalization
+])
+
+# Dedicated inference pool; requests beyond workers + queue get 503
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", os.cpu_count() or 1))
+INFERENCE_QUEUE = int(os.environ.get("INFERENCE_QUEUE", 4 * INFERENCE_THREADS))
+inference_executor = BoundedExecutor(INFERENCE_THREADS, INFERENCE_QUEUE, name="inference")
+torch.set_num_threads(max(1, (os.cpu_count() or 1) // INFERENCE_THREADS))  # Avoid oversubscribing cores
+
+# Per-stage timings (open, decode, transform, forward, postprocess), also exported on /metrics
+stage_timer = StageTimer(observer=observe_stage)
+
+# Decode large uploads at reduced resolution; refuse anything over the pixel limit
+REDUCED_DECODE = os.environ.get("REDUCED_DECODE", "1") == "1"
+MAX_INPUT_PIXELS = int(os.environ.get("MAX_INPUT_PIXELS", 50_000_000))
+
+# Results of a running /predict_batch job waiting for the client
+BATCH_RESULT_QUEUE = 4
+
+# Parallel decode/transform for /predict_batch
+preprocess_pool = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="preprocess")
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 
+def get_model_source():
+    """Returns where the model comes from: Drive by default, or a local stand-in.
+
+    MODEL_SOURCE_DIR serves model.pth from a local directory and
+    MODEL_SOURCE_URL from any HTTP server (both handy for tests).
+    """
+    if os.environ.get("MODEL_SOURCE_DIR"):
+        return LocalDirSource(os.environ["MODEL_SOURCE_DIR"], "model.pth")
+    if os.environ.get("MODEL_SOURCE_URL"):
+        return HttpSource(os.environ["MODEL_SOURCE_URL"])
+
+    creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE)
+    return DriveSource(creds, MODEL_FILE_ID)
+
 def load_model_from_drive():
-    """Downloads the model from Google Drive and loads it (PyTorch version)."""
-    global model, drive_service
+    """Fetches the model through the artifact cache and loads it (PyTorch version)."""
+    global model, model_version_tag
 
     try:
         logging.info("Loading model...")
 
-        # Authenticate with Google Drive API
-        if not drive_service:
-            creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE)
-            drive_service = discovery.build('drive', 'v3', credentials=creds)
-
-        # Create the directory if it doesn't exist
-        if not os.path.exists(MODEL_LOCAL_PATH):
-            os.makedirs(MODEL_LOCAL_PATH)
-
-        # Download the model
-        request = drive_service.files().get_media(fileId=MODEL_FILE_ID)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-            logging.info(f"Download %d%%" % int(status.progress() * 100))
-
-        # Save the model locally (adjust based on your model format)
+        # Stream the model to disk; skipped entirely when the local copy matches
         model_path = os.path.join(MODEL_LOCAL_PATH, "model.pth")  # Assuming a .pth file extension
-        with open(model_path, "wb") as f:
-            fh.seek(0)
-            f.write(fh.getvalue())
+        ArtifactCache(model_path).fetch(
+            get_model_source(),
+            progress=lambda done, total: logging.info(
+                "Download %d%%", int(done * 100 / total) if total else 0),
+        )
 
         # Load the model (PyTorch)
-        model = torch.load(model_path)
+        model = torch.load(model_path, map_location="cpu")
         model.eval()  # Set the model to evaluation mode
+        model_version_tag = model_version(model_path)
         logging.info("Model loaded successfully.")
 
     except Exception as e:
         logging.error(f"Error loading model: {e}")
         raise
 
+def preprocess_bytes(contents):
+    image, info = decode_image(contents, 224, max_pixels=MAX_INPUT_PIXELS, reduced=REDUCED_DECODE)
+    started = time.perf_counter()
+    tensor = transform(image)
+    stage_timer.record({**info["timings_ms"], "transform": (time.perf_counter() - started) * 1000})
+    return tensor
+
+def classify_bytes(contents):
+    """Decodes, transforms and classifies one image (blocking, runs in the inference pool)."""
+    image = preprocess_bytes(contents).unsqueeze(0)  # Reduced-resolution decode, then add batch dimension
+
+    # Perform inference
+    with torch.no_grad():  # Disable gradient calculation for inference
+        started = time.perf_counter()
+        prediction = model(image)
+        forwarded = time.perf_counter()
+        predicted_class = torch.argmax(prediction).item()  # Get the class with the highest probability
+    stage_timer.record({
+        "forward": (forwarded - started) * 1000,
+        "postprocess": (time.perf_counter() - forwarded) * 1000,
+    })
+
+    return {"predicted_class": predicted_class}
+
 async def process_image(file: UploadFile):
     """Processes the uploaded image and performs classification (PyTorch version)."""
     try:
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents)).convert("RGB")
-
-        # Define transformations (adjust as needed for your model)
-        transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize((0.4914, 0.4822, 0.4465), (0.2023, 0.1994, 0.2010))  # Example normalization
-        ])
-
-        image = transform(image)
-        image = image.unsqueeze(0)  # Add batch dimension
-        
-        image = image.to('cpu')  # Ensure data is on the CPU
-        # Perform inference
-        with torch.no_grad():  # Disable gradient calculation for inference
-            prediction = model.to('cpu')(image)
-            predicted_class = torch.argmax(prediction).item()  # Get the class with the highest probability
-
-        return {"predicted_class": predicted_class}
+        cache_key = prediction_cache.key(contents, model_version_tag)
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # CPU-bound work runs in the inference pool so the event loop stays free
+        result = await inference_executor.run(classify_bytes, contents)
+        prediction_cache.put(cache_key, result)
+        return result
 
+    except Overloaded:
+        raise
     except Exception as e:
         logging.error(f"Error processing image: {e}")
         raise
@@ -110,9 +165,89 @@ async def predict(file: UploadFile = File(...)):
     try:
         result = await process_image(file)
         return JSONResponse(content=result)
+    except Overloaded as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503,
+                            headers={"Retry-After": str(e.retry_after)})
+    except ImageTooLarge as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.post("/predict_batch")
+async def predict_batch(
+    images: Optional[List[UploadFile]] = File(None),
+    archive: Optional[List[UploadFile]] = File(None),
+    top_k: int = Query(5, ge=1, le=MAX_TOP_K),
+    batch_size: int = Query(32, ge=1, le=256),
+):
+    """Classifies many images (files and/or zip/tar archives) and streams NDJSON results.
+
+    The whole request is one job in the inference pool, so it is admitted (or
+    rejected with 503) like /predict and cannot starve it. Results are handed
+    to the response through a small queue; a slow client pauses the job and a
+    disconnected one stops it.
+    """
+    if not images and not archive:
+        return JSONResponse(content={"error": "No images or archive uploaded"}, status_code=400)
+
+    def items():
+        for f in images or []:
+            yield f.filename, f.file.read()
+        for f in archive or []:
+            yield from iter_archive(f.file, f.filename)
+
+    lines = queue.Queue(maxsize=BATCH_RESULT_QUEUE)
+    stopped = threading.Event()
+
+    def put(line):
+        while not stopped.is_set():
+            try:
+                lines.put(line, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def work():
+        try:
+            for line in run_batches(items(), preprocess_bytes, model, preprocess_pool,
+                                    batch_size=batch_size, k=top_k):
+                if not put(line):
+                    return
+        except ValueError as e:
+            put(json.dumps({"error": str(e)}) + "\n")
+        except Exception as e:
+            logging.error(f"Batch classification failed: {e}")
+            put(json.dumps({"error": str(e)}) + "\n")
+        finally:
+            put(None)
+
+    try:
+        inference_executor.submit(work)
+    except Overloaded as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503,
+                            headers={"Retry-After": str(e.retry_after)})
+
+    def generate():
+        # Sync generator: Starlette iterates it in a worker thread, off the event loop
+        try:
+            while (line := lines.get()) is not None:
+                yield line
+        finally:
+            stopped.set()  # Client gone (or done): let the job stop at its next result
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/inference_stats")
+async def inference_stats():
+    """Returns inference pool occupancy, rejection counts and average stage timings."""
+    return {**inference_executor.stats(), "stages": stage_timer.stats()}
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """Returns prediction cache hit/miss counters."""
+    return prediction_cache.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
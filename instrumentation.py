@@ -0,0 +1,279 @@
+"""Request, inference-stage, SQLite and event-loop metrics in Prometheus text format.
+
+One process-wide REGISTRY is shared by everything in the process. Services
+call instrument_fastapi(app) or instrument_flask(app) to get per-route
+latency histograms, in-flight gauges and a GET /metrics endpoint. Other
+modules record into the shared metrics below (observe_stage, observe_query).
+
+Recording is one lock acquisition and a bisect per observation, cheap enough
+to leave on in production.
+"""
+import asyncio
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram buckets (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("inference_stage_duration_seconds",
+                                   "Per-stage inference time (open, decode, transform, forward, postprocess).",
+                                   ("stage",))
+QUERY_SECONDS = REGISTRY.histogram("sqlite_query_duration_seconds", "SQLite work per call, by database and kind.",
+                                   ("db", "op"), buckets=FAST_BUCKETS)
+
+
+def _request_metrics(registry):
+    """(latency histogram, in-flight gauge) for the services instrumented on `registry`."""
+    return (registry.histogram("http_request_duration_seconds", "Request latency by route.",
+                               ("method", "route", "status")),
+            registry.gauge("http_requests_in_flight", "Requests currently being handled."))
+
+
+def _loop_lag_metric(registry):
+    return registry.histogram("event_loop_lag_seconds", "How late the event loop ran a periodic timer.",
+                              buckets=FAST_BUCKETS)
+
+
+def observe_stage(stage, ms):
+    """StageTimer-compatible observer: records one stage timing given in milliseconds."""
+    STAGE_SECONDS.observe(ms / 1000, stage)
+
+
+def observe_query(db, op, seconds):
+    QUERY_SECONDS.observe(seconds, db, op)
+
+
+async def monitor_loop_lag(interval=0.5, registry=REGISTRY):
+    """Measures how much later than requested a sleep wakes up; run as a task on the loop."""
+    lag = _loop_lag_metric(registry)
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag.observe(max(0.0, loop.time() - started - interval))
+
+
+def instrument_fastapi(app, registry=REGISTRY, lag_interval=0.5):
+    """Adds request metrics middleware, GET /metrics and the event-loop lag monitor."""
+    from starlette.responses import Response
+
+    async def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+    app.add_middleware(_AsgiMetricsMiddleware, registry=registry)
+
+    @app.on_event("startup")
+    async def start_lag_monitor():
+        app.state.loop_lag_task = asyncio.create_task(monitor_loop_lag(lag_interval, registry))
+
+    @app.on_event("shutdown")
+    async def stop_lag_monitor():
+        app.state.loop_lag_task.cancel()
+
+
+class _AsgiMetricsMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware) so streaming responses pass through untouched.
+
+    Routes are labelled with their template (/users/{username}), which FastAPI
+    puts in the scope once routing has matched; unmatched paths share one label.
+    """
+
+    def __init__(self, app, registry=REGISTRY):
+        self.app = app
+        self.request_seconds, self.in_flight = _request_metrics(registry)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec()
+            route = scope.get("route")
+            self.request_seconds.observe(time.perf_counter() - started, scope["method"],
+                                    getattr(route, "path", "unmatched"), status[0])
+
+
+def instrument_flask(app, registry=REGISTRY):
+    """Adds request metrics hooks and GET /metrics to a Flask app."""
+    from flask import Response, g, request
+
+    request_seconds, in_flight = _request_metrics(registry)
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        in_flight.inc()
+
+    @app.after_request
+    def _record(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            method, status = request.method, response.status_code
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+            # after_request runs before the body is sent (all of it, for a
+            # streamed response); the WSGI server closes the response once the
+            # body is out, so record there to cover the whole request
+            def finish():
+                in_flight.dec()
+                request_seconds.observe(time.perf_counter() - started, method, route, status)
+
+            response.call_on_close(finish)
+        return response
+
+    @app.teardown_request
+    def _teardown(exc):
+        # after_request is skipped when a view raises; balance the in-flight gauge here
+        if g.pop("_metrics_started", None) is not None:
+            in_flight.dec()
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype=CONTENT_TYPE)
@@ -0,0 +1,194 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from instrumentation import observe_query
+from sqlite_wal import connect
+from usage_rollups import RollupAccumulator, apply_retention, init_rollup_schema
+
+DB_PATH = "system_usage.db"
+FLUSH_INTERVAL = 5.0  # seconds between batched commits
+MAX_BUFFER = 100_000  # drop oldest samples beyond this if the disk stalls
+RETENTION_INTERVAL = 600.0  # seconds between retention passes
+
+
+def init_schema(conn):
+    """Creates the usage table with integer epoch timestamps, migrating the old TEXT layout."""
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(usage)")}
+    if columns.get("timestamp", "").upper() == "TEXT":
+        logging.info("Migrating usage.timestamp from TEXT to integer epoch seconds")
+        with conn:
+            conn.execute("ALTER TABLE usage RENAME TO usage_text_old")
+            _create_usage_table(conn)
+            # Old rows were written with local time; 'utc' converts them to epoch
+            conn.execute("""
+                INSERT INTO usage (id, timestamp, cpu_usage, ram_usage)
+                SELECT id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER), cpu_usage, ram_usage
+                FROM usage_text_old
+            """)
+            conn.execute("DROP TABLE usage_text_old")
+    else:
+        with conn:
+            _create_usage_table(conn)
+
+
+def init_host_metrics_schema(conn):
+    """One row per metric group per chunk: timestamps and a column-major value block."""
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS host_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                grp TEXT NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                columns TEXT NOT NULL,
+                timestamps BLOB,
+                "values" BLOB NOT NULL,
+                encoding TEXT NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_host_metrics_grp_ts ON host_metrics(grp, start_ts)")
+
+
+def _create_usage_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp INTEGER NOT NULL,
+            cpu_usage REAL,
+            ram_usage REAL
+        )
+    ''')
+
+
+class MetricsWriter:
+    """Buffers usage samples in memory and writes them from a background thread,
+    one executemany() transaction per flush interval. The same transaction
+    updates the 1-minute/1-hour rollups, and old rows are pruned every
+    RETENTION_INTERVAL seconds."""
+
+    def __init__(self, db_path=DB_PATH, flush_interval=FLUSH_INTERVAL, max_buffer=MAX_BUFFER,
+                 retention_interval=RETENTION_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retention_interval = retention_interval
+        self.rollups = RollupAccumulator()
+        # Bounded: when the disk stalls the oldest samples are dropped in O(1)
+        self._buffer = deque(maxlen=max_buffer)
+        self._retry = []  # Rows from a failed flush, already counted in the rollups
+        self._chunks = deque(maxlen=max_buffer)  # Packed host metric chunks
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.rows_written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, timestamp, cpu_usage, ram_usage):
+        """Queues one sample; never blocks on disk, safe to call from the event loop."""
+        with self._lock:
+            if len(self._buffer) == self.max_buffer:
+                self.dropped += 1
+            self._buffer.append((int(timestamp), cpu_usage, ram_usage))
+
+    def add_host_chunk(self, group, start_ts, end_ts, count, columns, timestamps, values, encoding):
+        """Queues one packed host-metrics chunk (see host_metrics.py)."""
+        with self._lock:
+            if len(self._chunks) == self.max_buffer:
+                self.dropped += 1
+            self._chunks.append((group, start_ts, end_ts, count, json.dumps(columns), timestamps, values, encoding))
+
+    def flush(self):
+        """Asks the writer thread to flush now (e.g. on shutdown)."""
+        self._wakeup.set()
+
+    def stop(self, timeout=10):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        conn = connect(self.db_path)
+        init_schema(conn)
+        init_rollup_schema(conn)
+        init_host_metrics_schema(conn)
+        self.rollups.load_open_buckets(conn)
+        last_retention = 0.0
+        try:
+            while not self._stopped.is_set():
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self._flush(conn)
+                if time.time() - last_retention >= self.retention_interval:
+                    last_retention = time.time()
+                    try:
+                        deleted = apply_retention(conn)
+                        if any(deleted.values()):
+                            logging.info("Retention pruned %s", deleted)
+                    except sqlite3.Error as e:
+                        logging.error("Retention pass failed: %s", e)
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def _flush(self, conn):
+        with self._lock:
+            fresh, chunks = list(self._buffer), list(self._chunks)
+            self._buffer.clear()
+            self._chunks.clear()
+        rows, self._retry = self._retry + fresh, []
+        if not rows and not chunks:
+            return
+        self.rollups.add(fresh)
+        started = time.perf_counter()
+        try:
+            with conn:  # One transaction, one commit
+                self.write_rows(conn, rows)
+                self.rollups.write(conn)
+                conn.executemany('''
+                    INSERT INTO host_metrics
+                        (grp, start_ts, end_ts, count, columns, timestamps, "values", encoding)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', chunks)
+        except sqlite3.Error as e:
+            logging.error("Failed to write %d usage samples: %s", len(rows), e)
+            # Retry on the next interval, keeping the newest max_buffer of each
+            self._retry = rows[-self.max_buffer:]
+            with self._lock:
+                pending = chunks + list(self._chunks)
+                self.dropped += len(rows) - len(self._retry) + max(0, len(pending) - self.max_buffer)
+                self._chunks = deque(pending[-self.max_buffer:], maxlen=self.max_buffer)
+            return
+        self.rollups.committed()
+        elapsed = time.perf_counter() - started
+        observe_query("system_usage", "flush", elapsed)
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.last_flush_ms = elapsed * 1000
+
+    def write_rows(self, conn, rows):
+        conn.executemany("INSERT INTO usage (timestamp, cpu_usage, ram_usage) VALUES (?, ?, ?)", rows)
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer) + len(self._retry)
+        return {
+            "buffered": buffered,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "flush_interval": self.flush_interval,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
@@ -0,0 +1,104 @@
+"""Pre-built model bundle for fast, network-free startup of app.py.
+
+A bundle directory holds everything the Flask classifier needs:
+    model.pt       frozen TorchScript model (any backend from model_variants.py)
+    labels.txt     ImageNet class names, one per line
+    manifest.json  backend, source weights version and build info
+
+Build once (network allowed), then start the server with MODEL_BUNDLE=<dir>:
+    python model_bundle.py --out bundle --backend torchscript
+"""
+import argparse
+import json
+import os
+import time
+
+MODEL_FILE = "model.pt"
+LABELS_FILE = "labels.txt"
+MANIFEST_FILE = "manifest.json"
+LABELS_URL = "https://raw.githubusercontent.com/pytorch/hub/master/imagenet_classes.txt"
+
+
+def read_labels(path):
+    with open(path, "r") as f:
+        return [line.strip() for line in f.read().splitlines()]
+
+
+def load_bundle(bundle_dir):
+    """Returns (model, labels, manifest) from a bundle without touching the network."""
+    import torch
+
+    with open(os.path.join(bundle_dir, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    labels = read_labels(os.path.join(bundle_dir, LABELS_FILE))
+    model = torch.jit.load(os.path.join(bundle_dir, MODEL_FILE), map_location="cpu")
+    model.eval()
+    return model, labels, manifest
+
+
+def build_bundle(out_dir, backend="torchscript", weights_path=os.path.join("model", "mobilenet_v2.pth"),
+                 labels_path=os.path.join("model", "imagenet_classes.txt"), calibration_dir=None):
+    """Builds a bundle from local weights/labels, downloading them only if missing."""
+    import requests
+    import torch
+    import torchvision.models as models
+    import torchvision.transforms as transforms
+
+    from model_variants import build_variant
+    from prediction_cache import model_version
+
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(weights_path) or ".", exist_ok=True)
+
+    if os.path.exists(labels_path):
+        labels = read_labels(labels_path)
+    else:
+        labels = requests.get(LABELS_URL).text.splitlines()
+
+    if os.path.exists(weights_path):
+        model = models.mobilenet_v2(weights=None)
+        model.load_state_dict(torch.load(weights_path, map_location="cpu"))
+    else:
+        model = models.mobilenet_v2(weights=models.MobileNet_V2_Weights.DEFAULT)
+        torch.save(model.state_dict(), weights_path)
+    model.eval()
+
+    transform = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    if backend == "eager":
+        # Bundles are always TorchScript so loading skips torchvision model construction
+        backend = "torchscript"
+    compiled, report = build_variant(model, backend, weights_path, transform=transform,
+                                     calibration_dir=calibration_dir)
+    torch.jit.save(compiled, os.path.join(out_dir, MODEL_FILE))
+
+    with open(os.path.join(out_dir, LABELS_FILE), "w") as f:
+        f.write("\n".join(labels))
+
+    manifest = {
+        "backend": backend,
+        "source_version": model_version(weights_path),
+        "num_labels": len(labels),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "torch": torch.__version__,
+        "report": report,
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bundle")
+    parser.add_argument("--backend", default="torchscript",
+                        help="torchscript, dynamic_int8 or static_int8")
+    parser.add_argument("--weights", default=os.path.join("model", "mobilenet_v2.pth"))
+    parser.add_argument("--labels", default=os.path.join("model", "imagenet_classes.txt"))
+    parser.add_argument("--calibration-dir", default=None)
+    args = parser.parse_args()
+    print(json.dumps(build_bundle(args.out, args.backend, args.weights, args.labels, args.calibration_dir), indent=2))
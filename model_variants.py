@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import time
+
+import torch
+from PIL import Image
+
+from prediction_cache import model_version
+
+# Selectable inference backends for the MobileNetV2 classifier
+BACKENDS = ("eager", "torchscript", "dynamic_int8", "static_int8")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+MAX_CALIBRATION_IMAGES = 256
+
+
+def _set_quantized_engine():
+    """Picks the int8 kernel library for this CPU (fbgemm on x86, qnnpack on ARM)."""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    return None
+
+
+def load_calibration_batch(calibration_dir, transform, limit=MAX_CALIBRATION_IMAGES):
+    """Loads up to `limit` images from a local folder as one preprocessed batch."""
+    if not calibration_dir or not os.path.isdir(calibration_dir):
+        return None
+    tensors = []
+    for name in sorted(os.listdir(calibration_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        try:
+            with Image.open(os.path.join(calibration_dir, name)) as img:
+                tensors.append(transform(img.convert("RGB")))
+        except OSError as e:
+            logging.warning("Skipping calibration image %s: %s", name, e)
+        if len(tensors) >= limit:
+            break
+    return torch.stack(tensors) if tensors else None
+
+
+def _forward_in_chunks(model, batch, chunk_size=32):
+    with torch.no_grad():
+        return torch.cat([model(chunk) for chunk in batch.split(chunk_size)])
+
+
+def top1_agreement(reference, candidate, batch):
+    """Fraction of images where candidate's top-1 class matches the reference model."""
+    ref = _forward_in_chunks(reference, batch).argmax(dim=1)
+    cand = _forward_in_chunks(candidate, batch).argmax(dim=1)
+    return (ref == cand).float().mean().item()
+
+
+def _trace_and_freeze(model, example):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    return torch.jit.freeze(traced)
+
+
+def _build_dynamic_int8(model):
+    # Only nn.Linear layers (the classifier head) have dynamic int8 kernels
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _build_static_int8(model, calibration_batch):
+    from torchvision.models.quantization import mobilenet_v2 as quantizable_mobilenet_v2
+
+    qmodel = quantizable_mobilenet_v2(weights=None, quantize=False)
+    qmodel.load_state_dict(model.state_dict())
+    qmodel.eval()
+    qmodel.fuse_model(is_qat=False)
+    qmodel.qconfig = torch.ao.quantization.get_default_qconfig(torch.backends.quantized.engine)
+    torch.ao.quantization.prepare(qmodel, inplace=True)
+    with torch.no_grad():
+        for chunk in calibration_batch.split(32):
+            qmodel(chunk)  # Observers record activation ranges
+    torch.ao.quantization.convert(qmodel, inplace=True)
+    return qmodel
+
+
+def variant_paths(model_path, backend):
+    base, _ = os.path.splitext(model_path)
+    return f"{base}.{backend}.pt", f"{base}.{backend}.json"
+
+
+def build_variant(model, backend, model_path, transform=None, calibration_dir=None):
+    """Returns (model, report) for the requested backend.
+
+    Converted variants are saved as frozen TorchScript next to `model_path`
+    and reused on restart as long as the source weights are unchanged.
+    The report includes top-1 agreement with the fp32 model when a
+    calibration folder is available.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "eager":
+        return model, {"backend": "eager"}
+
+    if backend in ("dynamic_int8", "static_int8"):
+        _set_quantized_engine()
+
+    source_version = model_version(model_path)
+    artifact_path, report_path = variant_paths(model_path, backend)
+    if os.path.exists(artifact_path) and os.path.exists(report_path):
+        with open(report_path, "r") as f:
+            report = json.load(f)
+        if report.get("source_version") == source_version:
+            logging.info("Loading cached %s model from %s", backend, artifact_path)
+            return torch.jit.load(artifact_path, map_location="cpu"), report
+
+    calibration_batch = load_calibration_batch(calibration_dir, transform) if transform else None
+    if calibration_batch is None and backend == "static_int8":
+        logging.warning("No calibration images found; calibrating static_int8 on random inputs")
+        calibration_batch = torch.randn(8, 3, 224, 224)
+    example = torch.randn(2, 3, 224, 224)
+
+    started = time.perf_counter()
+    logging.info("Building %s model variant...", backend)
+    if backend == "torchscript":
+        candidate = model
+    elif backend == "dynamic_int8":
+        candidate = _build_dynamic_int8(model)
+    else:
+        candidate = _build_static_int8(model, calibration_batch)
+    frozen = _trace_and_freeze(candidate, example)
+
+    report = {
+        "backend": backend,
+        "source_version": source_version,
+        "build_seconds": round(time.perf_counter() - started, 3),
+        "quantized_engine": torch.backends.quantized.engine,
+        "calibration_images": 0,
+        "top1_agreement": None,
+    }
+    if calibration_dir and os.path.isdir(calibration_dir) and calibration_batch is not None:
+        report["calibration_images"] = len(calibration_batch)
+        report["top1_agreement"] = top1_agreement(model, frozen, calibration_batch)
+        logging.info("%s top-1 agreement with fp32: %.4f on %d images",
+                     backend, report["top1_agreement"], report["calibration_images"])
+
+    torch.jit.save(frozen, artifact_path)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return frozen, report
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def model_version(path):
+    """Hashes a model file so retrained weights miss the cache."""
+    if not os.path.exists(path):
+        return os.path.basename(path)
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return f"{os.path.basename(path)}:{h.hexdigest()[:16]}"
+
+
+class PredictionCache:
+    """Content-addressed cache of prediction results.
+
+    Keys are the SHA-256 of the raw upload bytes plus the model version.
+    Values must be JSON-serializable (they are what the endpoint returns).
+    The in-memory tier is a bounded LRU; the optional disk tier keeps one
+    JSON file per key under `disk_dir`.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, disk_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(data, version):
+        h = hashlib.sha256(data)
+        h.update(b"\0" + version.encode())
+        return h.hexdigest()
+
+    def _expired(self, expires_at):
+        return expires_at is not None and expires_at < time.time()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".json")
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if not self._expired(expires_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        if self.disk_dir:
+            self._disk_put(key, value)
+
+    def _store(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry.get("expires_at")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry["value"]
+
+    def _disk_put(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            os.replace(tmp_path, path)  # Atomic so readers never see a partial file
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0,
+            }
+
+
+def cache_from_env(prefix="PREDICTION_CACHE"):
+    """Creates a PredictionCache configured from <prefix>_SIZE/_TTL/_DIR env vars."""
+    ttl = os.environ.get(f"{prefix}_TTL")
+    return PredictionCache(
+        max_entries=int(os.environ.get(f"{prefix}_SIZE", 1024)),
+        ttl=float(ttl) if ttl else None,
+        disk_dir=os.environ.get(f"{prefix}_DIR") or None,
+    )
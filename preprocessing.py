@@ -0,0 +1,87 @@
+import io
+import threading
+import time
+
+from PIL import Image
+
+# Refuse anything bigger than ~50 megapixels before decoding it
+MAX_INPUT_PIXELS = 50_000_000
+
+# Modes Image.reduce() handles and convert("RGB") understands after it
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK", "YCbCr")
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload exceeds the configured pixel limit."""
+
+
+class StageTimer:
+    """Thread-safe running totals of per-stage timings (milliseconds).
+
+    `observer(stage, ms)`, if given, also receives every timing (e.g.
+    instrumentation.observe_stage for the /metrics histograms).
+    """
+
+    def __init__(self, observer=None):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._counts = {}
+        self.observer = observer
+
+    def record(self, timings):
+        with self._lock:
+            for stage, ms in timings.items():
+                self._totals[stage] = self._totals.get(stage, 0.0) + ms
+                self._counts[stage] = self._counts.get(stage, 0) + 1
+        if self.observer is not None:
+            for stage, ms in timings.items():
+                self.observer(stage, ms)
+
+    def stats(self):
+        with self._lock:
+            return {
+                stage: {
+                    "count": self._counts[stage],
+                    "avg_ms": self._totals[stage] / self._counts[stage],
+                }
+                for stage in self._totals
+            }
+
+
+def decode_image(data, min_size, max_pixels=MAX_INPUT_PIXELS, reduced=True):
+    """Decodes upload bytes to an RGB image no smaller than `min_size` on its short side.
+
+    With `reduced=True`, JPEGs are decoded with PIL draft mode, which lets
+    libjpeg scale by 1/2, 1/4 or 1/8 in the DCT domain, and other formats
+    are box-reduced by an integer factor before the RGB conversion, so only
+    modes outside REDUCIBLE_MODES (palette, 16-bit, ...) pay for a
+    full-resolution convert. Either way the result still has at least
+    `min_size` pixels on its shorter side, so a later Resize(min_size)
+    produces the same geometry as a full decode.
+
+    Returns (image, info) where info holds per-stage timings in ms and the
+    original and decoded sizes.
+    """
+    timings = {}
+    started = time.perf_counter()
+    img = Image.open(io.BytesIO(data))  # Reads the header only
+    original_size = img.size
+    if original_size[0] * original_size[1] > max_pixels:
+        raise ImageTooLarge(
+            f"Image is {original_size[0]}x{original_size[1]}, limit is {max_pixels} pixels"
+        )
+    timings["open"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    if reduced and img.format == "JPEG":
+        img.draft("RGB", (min_size, min_size))
+    if reduced:
+        factor = min(img.size) // min_size
+        if factor >= 2:
+            if img.mode not in REDUCIBLE_MODES:  # e.g. 1, P, I;16B: no box filter, convert first
+                img = img.convert("RGB")
+            img = img.reduce(factor)
+    img = img.convert("RGB")
+    timings["decode"] = (time.perf_counter() - started) * 1000
+
+    return img, {"timings_ms": timings, "original_size": original_size, "decoded_size": img.size}
@@ -0,0 +1,201 @@
+import asyncio
+import functools
+import itertools
+import logging
+import time
+from datetime import datetime
+
+from cloud_backend import BAKED_STARTUP_SCRIPT, STARTUP_SCRIPT
+from warm_pool import wait_serving
+
+MAX_CONCURRENT_JOBS = 4
+MAX_FINISHED_JOBS = 200  # finished jobs kept for /scale/jobs
+SERVING_TIMEOUT = 900  # seconds for a new instance to answer on the app port
+
+
+class Job:
+    def __init__(self, job_id, instance_name):
+        self.id = job_id
+        self.instance_name = instance_name
+        self.state = "queued"  # queued -> running -> succeeded | failed
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.attempts = 0
+        self.source = None     # "warm" (promoted from the warm pool) or "cold" (created)
+        self.serving_at = None
+        self.steps = {}
+
+    @property
+    def time_to_serving(self):
+        return round(self.serving_at - self.created_at, 3) if self.serving_at else None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "instance": self.instance_name,
+            "state": self.state,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "duration_s": round(self.finished_at - self.created_at, 3) if self.finished_at else None,
+            "attempts": self.attempts,
+            "source": self.source,
+            "time_to_serving_s": self.time_to_serving,
+            "steps": self.steps,
+        }
+
+
+class ProvisioningQueue:
+    """Runs scale-out jobs in the background so the event loop never blocks on the cloud.
+
+    Backend calls run in worker threads. Authentication, SSH keys and the
+    firewall rule are set up once per process (keys and firewall rule
+    concurrently) and must succeed before the job touches an instance, so a
+    setup failure never leaves behind a VM that no job owns. The instance is a
+    member promoted from the warm pool when one is ready, otherwise a new one
+    (from `source_image` when a baked image is configured). A job succeeds
+    once the instance answers on the app port; time-to-serving is measured
+    from submission.
+
+    Jobs are keyed: submitting a key that is queued, running or already
+    succeeded returns the existing job, and a failed job is retried with the
+    same instance, which the backend treats idempotently.
+    """
+
+    def __init__(self, backend, max_concurrent=MAX_CONCURRENT_JOBS, on_success=None, warm_pool=None,
+                 source_image=None, serving_timeout=SERVING_TIMEOUT, poll_interval=2.0,
+                 on_start=None, on_failure=None):
+        self.backend = backend
+        self.on_start = on_start      # called once the job's instance is chosen
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.warm_pool = warm_pool
+        self.source_image = source_image
+        self.serving_timeout = serving_timeout
+        self.poll_interval = poll_interval
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._jobs = {}
+        self._setup = {}  # step name -> asyncio.Task
+        self._counter = itertools.count(1)
+        self._tasks = set()
+
+    def submit(self, key=None):
+        key = key or f"job-{datetime.now().strftime('%Y%m%d%H%M%S')}-{next(self._counter)}"
+        job = self._jobs.get(key)
+        if job is not None and job.state != "failed":
+            return job
+        if job is None:
+            job = self._jobs[key] = Job(key, f"auto-scaled-instance-{key}".lower()[:63].rstrip("-"))
+        else:
+            job.state, job.error, job.finished_at, job.steps = "queued", None, None, {}
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._trim()
+        return job
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.state in ("succeeded", "failed")]
+        for job in sorted(finished, key=lambda j: j.created_at)[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job.id]
+
+    async def _step(self, job, name, fn, *args):
+        step = job.steps[name] = {"state": "running", "started_at": time.time()}
+        try:
+            await fn(*args)
+            step["state"] = "done"
+        except Exception as e:
+            step["state"] = "failed"
+            step["error"] = str(e)
+            raise
+        finally:
+            step["duration_s"] = round(time.time() - step["started_at"], 3)
+
+    def _once(self, name):
+        """Shared task for a one-time setup step; a failed attempt is retried by the next job."""
+        task = self._setup.get(name)
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = self._setup[name] = asyncio.ensure_future(asyncio.to_thread(getattr(self.backend, name)))
+        return asyncio.shield(task)
+
+    async def _run(self, job):
+        async with self._slots:
+            job.state = "running"
+            job.attempts += 1
+            try:
+                await self._step(job, "authenticate", self._once, "authenticate")
+                results = await asyncio.gather(
+                    self._step(job, "ensure_ssh_keys", self._once, "ensure_ssh_keys"),
+                    self._step(job, "ensure_firewall_rule", self._once, "ensure_firewall_rule"),
+                    return_exceptions=True,
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        raise result
+                await self._instance_step(job)
+                await self._step(job, "wait_serving", wait_serving, self.backend, job.instance_name,
+                                 self.serving_timeout, self.poll_interval)
+                job.serving_at = time.time()
+                job.state = "succeeded"
+            except Exception as e:
+                job.state = "failed"
+                job.error = str(e)
+                logging.error("Provisioning job %s failed: %s", job.id, e)
+            finally:
+                job.finished_at = time.time()
+        callback = self.on_success if job.state == "succeeded" else self.on_failure
+        if callback is not None:
+            callback(job)
+
+    def _instance_step(self, job):
+        if job.source is None and self.warm_pool is not None:
+            warm = self.warm_pool.take()
+            if warm is not None:
+                job.source, job.instance_name = "warm", warm
+        job.source = job.source or "cold"
+        if self.on_start is not None:
+            self.on_start(job)
+        if job.source == "warm":
+            return self._step(job, "promote_warm", self.warm_pool.promote, job.instance_name)
+        startup_script = BAKED_STARTUP_SCRIPT if self.source_image else STARTUP_SCRIPT
+        create = functools.partial(self.backend.create_instance, job.instance_name,
+                                   startup_script=startup_script, source_image=self.source_image)
+        return self._step(job, "create_instance", asyncio.to_thread, create)
+
+    def time_to_serving(self):
+        """Time-to-serving summary per source over finished jobs."""
+        result = {}
+        for source in ("warm", "cold"):
+            samples = sorted(j.time_to_serving for j in self._jobs.values()
+                             if j.source == source and j.serving_at is not None)
+            result[source] = {"count": len(samples)} if not samples else {
+                "count": len(samples),
+                "mean_s": round(sum(samples) / len(samples), 3),
+                "p50_s": samples[len(samples) // 2],
+                "max_s": samples[-1],
+            }
+        return result
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, state=None):
+        return [j.to_dict() for j in self._jobs.values() if state is None or j.state == state]
+
+    def stats(self):
+        counts = {}
+        for job in self._jobs.values():
+            counts[job.state] = counts.get(job.state, 0) + 1
+        setup = {
+            name: "done" if task.done() and not task.cancelled() and task.exception() is None
+            else "failed" if task.done() else "running"
+            for name, task in self._setup.items()
+        }
+        return {
+            "jobs": counts,
+            "setup": setup,
+            "backend": type(self.backend).__name__,
+            "time_to_serving": self.time_to_serving(),
+            "warm_pool": self.warm_pool.stats() if self.warm_pool is not None else None,
+        }
@@ -0,0 +1,126 @@
+import numpy as np
+
+DEFAULT_CAPACITY = 6 * 3600  # six hours at 1 Hz
+
+
+class MetricRingBuffer:
+    """Fixed-capacity, preallocated ring buffer of timestamped samples for several metrics.
+
+    Every sample is written twice, at slot i and i + capacity, so the most
+    recent n samples (n <= capacity) are always one contiguous slice. Window
+    queries therefore return NumPy views instead of copies. Views are only
+    valid until the next append.
+    """
+
+    def __init__(self, metrics, capacity=DEFAULT_CAPACITY):
+        self.metrics = tuple(metrics)
+        self.capacity = capacity
+        self._index = {name: i for i, name in enumerate(self.metrics)}
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(self.metrics), 2 * capacity), dtype=np.float64)
+        self._head = 0   # next slot to write, in [0, capacity)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, values):
+        """Adds one sample; `values` maps metric name -> value (or is a sequence in metric order)."""
+        if isinstance(values, dict):
+            values = [values[name] for name in self.metrics]
+        slot = self._head
+        for offset in (slot, slot + self.capacity):
+            self._timestamps[offset] = timestamp
+            self._values[:, offset] = values
+        self._head = (slot + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _slice(self, n):
+        n = min(n, self._count)
+        end = self._head + self.capacity
+        return slice(end - n, end)
+
+    def last(self, n):
+        """Returns (timestamps, values) views of the newest n samples; values is (metrics, n)."""
+        s = self._slice(n)
+        return self._timestamps[s], self._values[:, s]
+
+    def since(self, timestamp):
+        """Returns (timestamps, values) views of samples at or after `timestamp`."""
+        timestamps, values = self.last(self._count)
+        start = np.searchsorted(timestamps, timestamp, side="left")
+        return timestamps[start:], values[:, start:]
+
+    def series(self, metric, seconds=None, n=None):
+        """Returns (timestamps, values) views for one metric over the last `seconds` or `n` samples."""
+        if seconds is not None:
+            timestamps, values = self.since(self.latest_timestamp() - seconds)
+        else:
+            timestamps, values = self.last(self._count if n is None else n)
+        return timestamps, values[self._index[metric]]
+
+    def latest_timestamp(self):
+        return int(self._timestamps[self._head + self.capacity - 1]) if self._count else 0
+
+    # --- Vectorized window statistics -------------------------------------------------
+
+    def moving_average(self, metric, k, seconds=None):
+        """Simple moving average over k samples, via cumulative sums."""
+        _, x = self.series(metric, seconds)
+        if x.size < k or k <= 0:
+            return np.empty(0)
+        c = np.cumsum(np.insert(x, 0, 0.0))
+        return (c[k:] - c[:-k]) / k
+
+    def ewma(self, metric, alpha, seconds=None):
+        """Exponentially weighted mean of the window, newest sample weighted highest."""
+        _, x = self.series(metric, seconds)
+        if x.size == 0:
+            return None
+        weights = (1 - alpha) ** np.arange(x.size - 1, -1, -1)
+        return float(np.dot(weights, x) / weights.sum())
+
+    def percentiles(self, metric, qs=(50, 95, 99), seconds=None):
+        _, x = self.series(metric, seconds)
+        if x.size == 0:
+            return {q: None for q in qs}
+        return dict(zip(qs, np.percentile(x, qs).tolist()))
+
+    def rate_of_change(self, metric, seconds=None):
+        """Least-squares slope of the window, in units per second."""
+        t, x = self.series(metric, seconds)
+        if x.size < 2 or t[-1] == t[0]:
+            return 0.0
+        t = t - t.mean()
+        return float(np.dot(t, x - x.mean()) / np.dot(t, t))
+
+    def seconds_above(self, metric, threshold):
+        """How long the metric has been continuously above `threshold`, up to the newest sample."""
+        t, x = self.series(metric)
+        if x.size == 0 or x[-1] <= threshold:
+            return 0
+        below = np.flatnonzero(x <= threshold)
+        start = below[-1] + 1 if below.size else 0
+        return int(t[-1] - t[start])
+
+    def summary(self, seconds=None, alpha=0.3):
+        """Per-metric mean/min/max/EWMA/percentiles/rate for the window."""
+        result = {}
+        for metric in self.metrics:
+            _, x = self.series(metric, seconds)
+            if x.size == 0:
+                result[metric] = None
+                continue
+            pct = self.percentiles(metric, seconds=seconds)
+            result[metric] = {
+                "count": int(x.size),
+                "mean": float(x.mean()),
+                "min": float(x.min()),
+                "max": float(x.max()),
+                "ewma": self.ewma(metric, alpha, seconds),
+                "p50": pct[50],
+                "p95": pct[95],
+                "p99": pct[99],
+                "rate_per_min": self.rate_of_change(metric, seconds) * 60,
+            }
+        return result
@@ -0,0 +1,10 @@
+import sqlite3
+
+
+def connect(db_path, **kwargs):
+    """Opens a connection in WAL mode: readers never block the writer and commits
+    append to the log instead of rewriting pages. Extra arguments go to sqlite3.connect."""
+    conn = sqlite3.connect(db_path, check_same_thread=False, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints, not every commit
+    return conn
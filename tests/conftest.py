@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# The services are flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def users_client(tmp_path, monkeypatch):
+    """TestClient for the user management API on a fresh database."""
+    from fastapi.testclient import TestClient
+
+    import Assignment_microservice_1 as service
+
+    monkeypatch.setenv("USER_DB", str(tmp_path / "users.db"))
+    with TestClient(service.app) as client:
+        yield client
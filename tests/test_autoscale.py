@@ -0,0 +1,68 @@
+import pytest
+
+from autoscale_policy import (
+    ForecastPolicy, Observation, ScalingPolicy, ThresholdPolicy, make_policy, parse_params,
+)
+from autoscale_replay import simulate
+
+
+def _ramp(start=0, seconds=1200, step=5):
+    """Idle, a 10-minute burst at 95% CPU, then idle again."""
+    for ts in range(start, start + seconds, step):
+        yield ts, 95.0 if 300 <= ts - start < 900 else 10.0, 40.0
+
+
+def test_base_policy_is_abstract():
+    with pytest.raises(TypeError):
+        ScalingPolicy()
+
+
+def test_threshold_waits_for_sustain_then_respects_cooldown():
+    policy = ThresholdPolicy(high=75, sustain=10, cooldown=60)
+    assert policy.decide(Observation(0, 90, 0), 1).delta == 0
+    assert policy.decide(Observation(10, 90, 0), 1).delta == 1
+    assert policy.decide(Observation(30, 90, 0), 2).delta == 0  # cooling down
+    assert policy.decide(Observation(80, 90, 0), 2).delta == 1
+
+
+def test_decide_clamps_to_fleet_limits():
+    policy = ThresholdPolicy(high=75, sustain=0, cooldown=0, max_instances=2)
+    assert policy.decide(Observation(0, 90, 0), 2).delta == 0
+
+
+def test_forecast_matches_a_full_refit():
+    policy = ForecastPolicy(window=60, horizon=30)
+    history = []
+    for ts in range(0, 3000, 5):
+        cpu = 50 + 40 * ((ts // 300) % 2) + (ts % 7)
+        policy.propose(Observation(ts, cpu, 0), 1)
+        history = [(t, x) for t, x in history + [(ts, cpu)] if t >= ts - 60]
+        n = len(history)
+        if n < 3:
+            continue
+        t_mean = sum(t for t, _ in history) / n
+        x_mean = sum(x for _, x in history) / n
+        var = sum((t - t_mean) ** 2 for t, _ in history)
+        slope = sum((t - t_mean) * (x - x_mean) for t, x in history) / var
+        assert policy.forecast() == pytest.approx(x_mean + slope * (ts + 30 - t_mean))
+
+
+def test_make_policy_parses_params():
+    policy = make_policy("ewma", **parse_params("alpha=0.3,high=70"))
+    assert (policy.alpha, policy.high) == (0.3, 70)
+
+
+def test_replay_scales_out_for_the_burst_and_back_in():
+    report = simulate(ThresholdPolicy(sustain=10, sustain_in=120, cooldown=60), list(_ramp()), boot_seconds=30)
+    assert report["samples"] == 240
+    assert report["scale_out_events"] >= 1
+    assert report["scale_in_events"] >= 1
+    assert report["final_instances"] == 1
+    assert report["peak_instances"] > 1
+
+
+def test_replay_counts_unserved_load_as_saturated():
+    # With no serving instance the load is 100%, so every sample is over the threshold
+    rows = [(ts, 10.0, 40.0) for ts in range(0, 100, 10)]
+    report = simulate(make_policy("threshold", min_instances=0, sustain_in=10 ** 6), rows, initial_instances=0)
+    assert report["seconds_over_threshold"] == 90
@@ -0,0 +1,39 @@
+import importlib
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """The monitoring service on a fake cloud, with its databases in a temporary directory."""
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setenv("CLOUD_BACKEND", "fake")
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop("Assignment_microservice_3", None)
+    module = importlib.import_module("Assignment_microservice_3")
+    yield module, TestClient(module.app)  # No startup: the sampler and fleet stay idle
+    module.fleet.registry.close()
+    sys.modules.pop("Assignment_microservice_3", None)
+
+
+def test_cpu_ram_stats(service):
+    module, client = service
+    for ts, cpu in enumerate([20, 80, 90, 95]):
+        module.usage_buffer.append(1000 + ts * 5, (cpu, 40))
+    response = client.get("/cpu_ram/stats", params={"window": 60})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["cpu_threshold"] == module.autoscale_policy.high
+    assert body["cpu_seconds_above_threshold"] == 10
+    assert body["metrics"]["cpu"]["count"] == 4
+
+
+def test_policy_observation_comes_from_the_ring_buffer(service, monkeypatch):
+    module, _ = service
+    for ts, cpu in enumerate([10, 20, 30, 60]):
+        module.usage_buffer.append(1000 + ts * 5, (cpu, 40))
+    assert module.usage_observation(1015).cpu == 60
+    monkeypatch.setattr(module, "AUTOSCALE_WINDOW", 10)
+    assert module.usage_observation(1015).cpu == pytest.approx(110 / 3)
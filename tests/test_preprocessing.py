@@ -0,0 +1,45 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from preprocessing import ImageTooLarge, decode_image
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def _sixteen_bit_tiff(size=(1200, 900), mode="I;16B"):
+    pixels = np.linspace(0, 65535, size[0] * size[1]).astype(">u2" if mode == "I;16B" else "<u2")
+    return _encode(Image.frombytes(mode, size, pixels.reshape(size[1], size[0]).tobytes()), "TIFF")
+
+
+@pytest.mark.parametrize("data", [
+    _encode(Image.new("RGB", (1200, 900), "red"), "JPEG"),
+    _encode(Image.new("RGB", (1200, 900), "red"), "PNG"),
+    _encode(Image.new("RGBA", (1200, 900), "red"), "WEBP"),
+    _encode(Image.new("P", (1200, 900)), "PNG"),
+    _encode(Image.new("1", (1200, 900)), "PNG"),
+    _encode(Image.new("LA", (1200, 900)), "PNG"),
+    _sixteen_bit_tiff(mode="I;16B"),
+    _sixteen_bit_tiff(mode="I;16"),
+], ids=["jpeg", "png", "webp-rgba", "png-palette", "png-1bit", "png-la", "tiff-16b", "tiff-16l"])
+def test_reduced_decode_keeps_min_size(data):
+    image, info = decode_image(data, 256)
+    assert image.mode == "RGB"
+    assert info["original_size"] == (1200, 900)
+    assert 256 <= min(image.size) < 900
+
+
+def test_full_decode_when_not_reduced():
+    image, _ = decode_image(_sixteen_bit_tiff(), 256, reduced=False)
+    assert (image.mode, image.size) == ("RGB", (1200, 900))
+
+
+def test_pixel_limit():
+    with pytest.raises(ImageTooLarge):
+        decode_image(_encode(Image.new("RGB", (100, 100)), "PNG"), 32, max_pixels=5000)
@@ -0,0 +1,98 @@
+import asyncio
+
+from cloud_backend import FakeBackend
+from provisioning import ProvisioningQueue
+from warm_pool import WarmPool
+
+SPEED = 0.0005  # FakeBackend latencies are scaled by this factor
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _until_done(*jobs):
+    while any(job.state in ("queued", "running") for job in jobs):
+        await asyncio.sleep(0.005)
+
+
+def test_jobs_succeed_and_setup_runs_once():
+    async def scenario():
+        backend = FakeBackend(speed=SPEED)
+        queue = ProvisioningQueue(backend, max_concurrent=2, poll_interval=0.005)
+        jobs = [queue.submit() for _ in range(4)]
+        await _until_done(*jobs)
+        return backend, queue, jobs
+
+    backend, queue, jobs = _run(scenario())
+    assert [job.state for job in jobs] == ["succeeded"] * 4
+    assert all(job.source == "cold" and job.time_to_serving is not None for job in jobs)
+    assert backend.calls["authenticate"] == 1
+    assert backend.calls["ensure_ssh_keys"] == 1
+    assert backend.calls["ensure_firewall_rule"] == 1
+    assert len(backend.instances) == 4
+    assert queue.stats()["jobs"] == {"succeeded": 4}
+
+
+def test_submit_is_idempotent_per_key():
+    async def scenario():
+        queue = ProvisioningQueue(FakeBackend(speed=SPEED), poll_interval=0.005)
+        first = queue.submit("scale-1")
+        assert queue.submit("scale-1") is first
+        await _until_done(first)
+        assert queue.submit("scale-1") is first
+        return queue
+
+    assert _run(scenario()).stats()["jobs"] == {"succeeded": 1}
+
+
+def test_failed_setup_creates_no_instance_and_is_retried():
+    async def scenario():
+        backend = FakeBackend(speed=SPEED, fail={"ensure_firewall_rule": 1})
+        queue = ProvisioningQueue(backend, poll_interval=0.005)
+        job = queue.submit("scale-1")
+        await _until_done(job)
+        assert job.state == "failed"
+        assert job.steps["ensure_firewall_rule"]["state"] == "failed"
+        assert backend.instances == {}
+
+        retried = queue.submit("scale-1")
+        await _until_done(retried)
+        return backend, retried
+
+    backend, job = _run(scenario())
+    assert job.state == "succeeded"
+    assert job.attempts == 2
+    assert backend.calls["ensure_firewall_rule"] == 2
+    assert list(backend.instances) == [job.instance_name]
+
+
+def test_callbacks_report_outcome():
+    finished = []
+
+    async def scenario():
+        backend = FakeBackend(speed=SPEED, fail={"create_instance": 1})
+        queue = ProvisioningQueue(backend, poll_interval=0.005,
+                                  on_success=lambda job: finished.append(("ok", job.id)),
+                                  on_failure=lambda job: finished.append(("failed", job.id)))
+        await _until_done(queue.submit("a"))
+        await _until_done(queue.submit("a"))
+
+    _run(scenario())
+    assert finished == [("failed", "a"), ("ok", "a")]
+
+
+def test_warm_member_is_promoted_instead_of_created():
+    async def scenario():
+        backend = FakeBackend(speed=SPEED)
+        pool = WarmPool(backend, size=1, mode="running", poll_interval=0.005)
+        await pool._prepare("warm-pool-test-1")
+        queue = ProvisioningQueue(backend, warm_pool=pool, poll_interval=0.005)
+        job = queue.submit()
+        await _until_done(job)
+        return job
+
+    job = _run(scenario())
+    assert job.state == "succeeded"
+    assert (job.source, job.instance_name) == ("warm", "warm-pool-test-1")
+    assert "promote_warm" in job.steps and "create_instance" not in job.steps
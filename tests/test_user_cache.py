@@ -0,0 +1,92 @@
+import asyncio
+
+from user_cache import UserCache, user_cache_from_env
+from user_store import UserStore
+
+
+def test_lookup_hit_and_lru_eviction():
+    cache = UserCache(max_entries=2)
+    for name in ("a", "b"):
+        cache.put_user(name, (1, name), cache.generation)
+    assert cache.get_user("a") == (True, (1, "a"))  # a is now most recent
+    cache.put_user("c", (3, "c"), cache.generation)
+    assert cache.get_user("b") == (False, None)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_negative_entries_only_with_ttl():
+    cache = UserCache()
+    cache.put_user("ghost", None, cache.generation)
+    assert cache.get_user("ghost") == (False, None)
+    cache = UserCache(negative_ttl=60)
+    cache.put_user("ghost", None, cache.generation)
+    assert cache.get_user("ghost") == (True, None)
+
+
+def test_fill_that_raced_a_write_is_dropped():
+    cache = UserCache()
+    generation = cache.generation
+    cache.invalidate(["a"], inserted=True)
+    cache.put_user("a", (1, "a"), generation)
+    cache.put_page(("c", 10, None), ([], None), generation)
+    assert cache.get_user("a") == (False, None)
+    assert cache.get_page(("c", 10, None)) is None
+
+
+def test_pages_dropped_only_on_insert():
+    cache = UserCache()
+    cache.put_page("key", ([(1, "a")], None), cache.generation)
+    cache.invalidate(["a"], inserted=False)
+    assert cache.get_page("key") is not None
+    cache.invalidate(["b"], inserted=True)
+    assert cache.get_page("key") is None
+
+
+def test_pages_bounded_by_bytes():
+    cache = UserCache(max_pages=100, max_page_bytes=20_000)
+    page = ([(i, f"user{i:05d}") for i in range(50)], None)
+    for key in range(10):
+        cache.put_page(key, page, cache.generation)
+    stats = cache.stats()
+    assert 0 < stats["pages"] < 10
+    assert stats["page_bytes"] <= 20_000
+    assert cache.get_page(9) is not None and cache.get_page(0) is None
+
+    huge = ([(i, f"user{i:05d}") for i in range(1000)], None)
+    cache.put_page("huge", huge, cache.generation)
+    assert cache.get_page("huge") is None  # larger than the whole budget
+    assert cache.get_page(9) is not None   # and did not flush the rest
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("USER_CACHE_SIZE", "0")
+    assert user_cache_from_env() is None
+    monkeypatch.setenv("USER_CACHE_SIZE", "5")
+    monkeypatch.setenv("USER_CACHE_PAGE_BYTES", "1000")
+    stats = user_cache_from_env().stats()
+    assert (stats["max_entries"], stats["max_page_bytes"]) == (5, 1000)
+
+
+def test_store_reads_through_and_invalidates(tmp_path):
+    async def scenario():
+        store = UserStore(str(tmp_path / "users.db"), cache=UserCache(negative_ttl=60))
+        try:
+            assert await store.get_user("alice") is None
+            assert await store.get_user("alice") is None  # negative hit
+            await store.add_user("alice", "pw")
+            assert (await store.get_user("alice"))[1] == "alice"
+            assert (await store.get_user("alice"))[1] == "alice"
+            first = await store.list_page(limit=10)
+            assert await store.list_page(limit=10) == first
+            await store.add_user("bob", "pw")
+            rows, _ = await store.list_page(limit=10)
+            return [username for _, username in rows], store.stats()
+        finally:
+            store.close()
+
+    names, stats = asyncio.run(scenario())
+    assert names == ["alice", "bob"]
+    assert stats["reads"] == 4  # miss, miss after the insert, first page, page after the insert
+    assert stats["cache"]["negative_hits"] == 1
+    assert stats["cache"]["hits"] == 1
+    assert stats["cache"]["page_hit_rate"] == 1 / 3
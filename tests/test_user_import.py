@@ -0,0 +1,127 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from user_import import BulkImportError, detect_format, iter_records, validate
+from user_store import UserStore
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _records(fmt, *chunks):
+    async def collect():
+        return [item async for item in iter_records(_chunks(*chunks), fmt)]
+    return asyncio.run(collect())
+
+
+def test_upsert_reports_inserted_and_updated(tmp_path):
+    async def scenario():
+        store = UserStore(str(tmp_path / "users.db"))
+        try:
+            first = await store.upsert_users([("a", "1"), ("b", "1")])
+            second = await store.upsert_users([("b", "2"), ("c", "1"), ("c", "2")])
+            rows, _ = await store.list_page(limit=10)
+            return first, second, rows
+        finally:
+            store.close()
+
+    first, second, rows = asyncio.run(scenario())
+    assert first == ["inserted", "inserted"]
+    assert second == ["updated", "inserted", "updated"]
+    assert [username for _, username in rows] == ["a", "b", "c"]
+
+
+def test_detect_format():
+    assert detect_format("text/csv; charset=utf-8") == "csv"
+    assert detect_format("application/x-ndjson") == "ndjson"
+    assert detect_format("text/plain", explicit="json") == "json"
+    with pytest.raises(BulkImportError):
+        detect_format("text/plain")
+
+
+def test_validate_strips_username_and_rejects_bad_rows():
+    assert validate({"username": " alice ", "password": "pw"}) == ("alice", "pw")
+    for record in ({"username": "", "password": "pw"}, {"username": "a"}, ["a", "pw"]):
+        with pytest.raises(ValueError):
+            validate(record)
+
+
+def test_ndjson_lines_split_across_chunks():
+    records = _records("ndjson", b'{"username": "a", "pas', b'sword": "1"}\r\n\n{bad}\n', b'{"username": "b"}')
+    assert records[0] == (1, {"username": "a", "password": "1"})
+    assert records[1][0] == 2 and isinstance(records[1][1], ValueError)
+    assert records[2] == (3, {"username": "b"})
+
+
+def test_csv_needs_a_header():
+    assert _records("csv", b"Password,Username\nx,a\n") == [(1, {"password": "x", "username": "a"})]
+    with pytest.raises(BulkImportError):
+        _records("csv", b"name,pw\na,x\n")
+
+
+def test_invalid_utf8_is_a_row_error():
+    records = _records("ndjson", b'{"username": "a", "password": "1"}\n\xff\xfe\n')
+    assert records[1][0] == 2 and "UTF-8" in str(records[1][1])
+    with pytest.raises(BulkImportError):
+        _records("csv", b"\xffusername,password\n")
+
+
+def test_json_body_must_be_an_array():
+    assert _records("json", b'[{"username": "a"}]') == [(1, {"username": "a"})]
+    with pytest.raises(BulkImportError):
+        _records("json", b'{"username": "a"}')
+
+
+def test_bulk_endpoint(users_client):
+    body = "username,password\nalice,1\n,2\nbob,3\nalice,4\n"
+    response = users_client.post("/users/bulk?chunk_size=2", content=body, headers={"content-type": "text/csv"})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("outcome") for line in lines[:-1]] == ["inserted", "error", "inserted", "updated"]
+    assert lines[-1] == {"summary": {"inserted": 2, "updated": 1, "error": 1}}
+
+
+def test_bulk_endpoint_rejects_unparseable_body(users_client):
+    response = users_client.post("/users/bulk", content="{}", headers={"content-type": "application/json"})
+    assert response.status_code == 400
+    response = users_client.post("/users/bulk", content="x", headers={"content-type": "text/plain"})
+    assert response.status_code == 415
+
+
+def test_bulk_endpoint_reports_a_failed_chunk_and_continues(users_client, monkeypatch):
+    import Assignment_microservice_1 as service
+
+    upsert_users = service.store.upsert_users
+    calls = []
+
+    async def flaky(rows):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("database is locked")
+        return await upsert_users(rows)
+
+    monkeypatch.setattr(service.store, "upsert_users", flaky)
+    body = "".join(json.dumps({"username": f"u{i}", "password": "pw"}) + "\n" for i in range(6))
+    response = users_client.post("/users/bulk?chunk_size=2", content=body,
+                                 headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 207
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["outcome"] for line in lines[:-1]] == ["inserted", "inserted", "error", "error",
+                                                       "inserted", "inserted"]
+    assert "database is locked" in lines[2]["error"]
+    assert lines[-1] == {"summary": {"inserted": 4, "updated": 0, "error": 2}}
+    assert users_client.get("/users/u2").status_code == 404
+
+
+def test_usernames_are_normalized_on_every_path(users_client):
+    assert users_client.post("/add_user/", params={"username": " bob ", "password": "1"}).json()["username"] == "bob"
+    response = users_client.post("/users/bulk", content='[{"username": "bob", "password": "2"}]',
+                                 headers={"content-type": "application/json"})
+    assert json.loads(response.text.splitlines()[0])["outcome"] == "updated"
+    assert users_client.get("/users/ bob").json()["username"] == "bob"
+    assert users_client.post("/add_user/", params={"username": "  ", "password": "1"}).status_code == 400
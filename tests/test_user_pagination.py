@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from user_store import UserStore, decode_cursor, encode_cursor, prefix_range
+
+NAMES = ["ann", "anna", "annie", "bob", "b\U0010ffff", "b\U0010ffffz", "carl"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+    asyncio.run(store.upsert_users([(name, "pw") for name in NAMES]))
+    yield store
+    store.close()
+
+
+def _all_pages(store, limit, prefix=None):
+    async def collect():
+        names, cursor = [], None
+        while True:
+            rows, cursor = await store.list_page(cursor, limit, prefix)
+            names.extend(username for _, username in rows)
+            if cursor is None:
+                return names
+    return asyncio.run(collect())
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor({"id": 42}), "id") == {"id": 42}
+    assert decode_cursor(encode_cursor({"u": "anna"}), "u") == {"u": "anna"}
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!", encode_cursor([1]), encode_cursor({"id": "1"}), encode_cursor({"id": 1, "x": 2}),
+    encode_cursor({"u": "anna"}),  # a username cursor used for the id ordering
+])
+def test_decode_cursor_rejects_foreign_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "id")
+
+
+def test_prefix_range():
+    assert prefix_range("ann") == ("ann", "ano")
+    assert prefix_range("b\U0010ffff") == ("b\U0010ffff", "c")
+    assert prefix_range("\U0010ffff") == ("\U0010ffff", None)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 100])
+def test_pages_by_id_cover_every_user_once(store, limit):
+    assert _all_pages(store, limit) == NAMES
+
+
+@pytest.mark.parametrize("prefix, expected", [
+    ("ann", ["ann", "anna", "annie"]),
+    ("b\U0010ffff", ["b\U0010ffff", "b\U0010ffffz"]),
+    ("\U0010ffff", []),
+    ("z", []),
+])
+def test_prefix_pages(store, prefix, expected):
+    assert _all_pages(store, 2, prefix) == expected
+
+
+def test_iter_users_streams_every_match(store):
+    async def collect():
+        return [username async for _, username in store.iter_users("b", page_size=1)]
+    assert asyncio.run(collect()) == sorted(name for name in NAMES if name.startswith("b"))
+
+
+def test_get_users_endpoint(users_client):
+    for name in NAMES:
+        users_client.post("/add_user/", params={"username": name, "password": "pw"})
+    first = users_client.get("/get_users/", params={"limit": 2, "prefix": "ann"}).json()
+    assert first["users"] == ["ann", "anna"]
+    second = users_client.get("/get_users/", params={"limit": 2, "prefix": "ann", "cursor": first["next_cursor"]})
+    assert second.json() == {"users": ["annie"], "next_cursor": None}
+    # A username cursor is not valid for the id ordering
+    assert users_client.get("/get_users/", params={"cursor": first["next_cursor"]}).status_code == 400
+
+    export = users_client.get("/get_users/export")
+    assert [json.loads(line)["username"] for line in export.text.splitlines()] == NAMES
@@ -0,0 +1,73 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from user_store import ConnectionPool, UserStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "users.db")
+
+
+def _run(store, coro_fn):
+    async def scenario():
+        try:
+            return await coro_fn(store)
+        finally:
+            store.close()
+    return asyncio.run(scenario())
+
+
+def test_add_and_get_user(db_path):
+    async def scenario(store):
+        assert await store.add_user("alice", "pw") == "inserted"
+        return await store.get_user("alice"), await store.get_user("bob")
+
+    alice, missing = _run(UserStore(db_path), scenario)
+    assert alice[1] == "alice"
+    assert missing is None
+
+
+def test_concurrent_reads_and_writes(db_path):
+    async def scenario(store):
+        await asyncio.gather(*(store.add_user(f"user{i}", "pw") for i in range(50)))
+        users = await asyncio.gather(*(store.get_user(f"user{i}") for i in range(50)))
+        return users, store.stats()
+
+    users, stats = _run(UserStore(db_path, readers=2), scenario)
+    assert [u[1] for u in users] == [f"user{i}" for i in range(50)]
+    assert stats["writes"] == 50
+    assert stats["reads"] == 50
+    assert stats["idle_readers"] == 2
+
+
+def test_failed_write_rolls_back(db_path):
+    def write_then_fail(conn):
+        conn.execute("INSERT INTO users (username, password) VALUES ('carol', 'pw')")
+        raise sqlite3.IntegrityError("boom")
+
+    async def scenario(store):
+        with pytest.raises(sqlite3.IntegrityError):
+            await store.pool.write(write_then_fail)
+        await store.add_user("dave", "pw")  # the writer connection is usable again
+        return await store.get_user("carol"), await store.get_user("dave")
+
+    carol, dave = _run(UserStore(db_path), scenario)
+    assert carol is None
+    assert dave is not None
+
+
+def test_readers_are_query_only(db_path):
+    UserStore(db_path).close()
+    pool = ConnectionPool(db_path, readers=1)
+
+    async def scenario():
+        return await pool.read(lambda conn: conn.execute("DELETE FROM users"))
+
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            asyncio.run(scenario())
+    finally:
+        pool.close()
@@ -0,0 +1,86 @@
+import asyncio
+import io
+import os
+import struct
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Distinguishes ETags across restarts, when the data version starts over
+_BOOT_ID = os.urandom(4).hex()
+
+
+def make_etag(version, kind="png"):
+    return f'W/"{_BOOT_ID}-{kind}-{version}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def render_usage_png(times, cpu_usages, ram_usages):
+    """Renders the CPU & RAM chart with the object-oriented Agg API.
+
+    Unlike pyplot this keeps no global figure state, so it is safe to call
+    from worker threads.
+    """
+    fig = Figure(figsize=(8, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(times, cpu_usages, marker='o', linestyle='-', color='b', label="CPU Usage")
+    ax.plot(times, ram_usages, marker='s', linestyle='-', color='r', label="RAM Usage")
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Usage (%)')
+    ax.set_title('Real-time CPU & RAM Usage')
+    ax.legend()
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True)
+    fig.tight_layout()
+
+    img = io.BytesIO()
+    fig.savefig(img, format='png')
+    return img.getvalue()
+
+
+def pack_series(epochs, cpu_usages, ram_usages):
+    """Packs series as little-endian: uint32 count, int64[count] epochs,
+    float32[count] cpu, float32[count] ram."""
+    n = len(epochs)
+    return struct.pack(f"<I{n}q{n}f{n}f", n, *epochs, *cpu_usages, *ram_usages)
+
+
+class GraphCache:
+    """Holds the PNG for the latest data version and renders each version once.
+
+    Concurrent requests for a version that is still rendering wait on the
+    same worker-thread render instead of starting their own.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._png = None
+        self._pending = None  # (version, asyncio.Task)
+        self.renders = 0
+        self.hits = 0
+
+    async def get(self, version, series_fn):
+        """Returns PNG bytes for `version`; series_fn() -> (times, cpu, ram) is called on a miss."""
+        if self._version == version:
+            self.hits += 1
+            return self._png
+        if self._pending is None or self._pending[0] != version:
+            times, cpu_usages, ram_usages = series_fn()
+            task = asyncio.ensure_future(asyncio.to_thread(render_usage_png, times, cpu_usages, ram_usages))
+            self._pending = (version, task)
+        task = self._pending[1]
+        png = await task
+        if self._pending is not None and self._pending[1] is task:
+            self._version, self._png, self._pending = version, png, None
+            self.renders += 1
+        return png
+
+    def stats(self):
+        return {"version": self._version, "renders": self.renders, "hits": self.hits}
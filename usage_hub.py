@@ -0,0 +1,68 @@
+import asyncio
+
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class Subscription:
+    """One subscriber's bounded queue; when full, the oldest sample is dropped."""
+
+    def __init__(self, hub, maxsize):
+        self._hub = hub
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, sample):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(sample)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BroadcastHub:
+    """Fans samples from the single background sampler out to all subscribers.
+
+    Must be used from the event loop thread. publish() never waits, so a slow
+    websocket client only loses its own oldest samples.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.latest = None
+        self.published = 0
+        self._subscribers = set()
+
+    def publish(self, sample):
+        self.latest = sample
+        self.published += 1
+        for subscription in self._subscribers:
+            subscription.put(sample)
+
+    def subscribe(self, send_latest=True):
+        subscription = Subscription(self, self.queue_size)
+        if send_latest and self.latest is not None:
+            subscription.put(self.latest)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "queue_size": self.queue_size,
+            "dropped": sum(s.dropped for s in self._subscribers),
+        }
@@ -0,0 +1,231 @@
+import math
+import time
+
+# Rollup resolutions (seconds) and their tables
+RESOLUTIONS = {60: "usage_1m", 3600: "usage_1h"}
+
+# How long each resolution is kept (seconds); None keeps rows forever
+RETENTION = {
+    0: 7 * 86400,        # raw samples in `usage`
+    60: 90 * 86400,      # 1-minute rollups
+    3600: None,          # 1-hour rollups
+}
+
+MAX_POINTS = 5000  # Largest number of buckets a single history query may return
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def init_rollup_schema(conn):
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_timestamp ON usage(timestamp)")
+        for table in RESOLUTIONS.values():
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket INTEGER PRIMARY KEY,
+                    count INTEGER NOT NULL,
+                    cpu_min REAL, cpu_sum REAL, cpu_max REAL, cpu_p95 REAL,
+                    ram_min REAL, ram_sum REAL, ram_max REAL, ram_p95 REAL
+                )
+            ''')
+
+
+class RollupAccumulator:
+    """Maintains the 1-minute and 1-hour rollup tables incrementally.
+
+    Samples for buckets that are still open are kept in memory. Each flush
+    merges the samples added since the last commit into the stored rows
+    (count, sum, min and max add up exactly), so partial buckets are
+    queryable and a late sample for a bucket already evicted from memory
+    adds to its row instead of replacing it. p95 is exact while memory holds
+    the whole bucket; otherwise it becomes the larger of the stored and new
+    p95, an upper bound. call committed() once the transaction has
+    committed: only then is the merged state forgotten.
+    """
+
+    def __init__(self):
+        self._open = {resolution: {} for resolution in RESOLUTIONS}  # resolution -> bucket -> ([cpu], [ram])
+        self._pending = {resolution: {} for resolution in RESOLUTIONS}  # same, samples not yet committed
+
+    def load_open_buckets(self, conn, now=None):
+        """Rebuilds in-memory state for the current buckets from raw rows after a restart."""
+        now = int(now if now is not None else time.time())
+        oldest = min(now - now % resolution for resolution in RESOLUTIONS)
+        rows = conn.execute(
+            "SELECT timestamp, cpu_usage, ram_usage FROM usage WHERE timestamp >= ? ORDER BY timestamp",
+            (oldest,),
+        ).fetchall()
+        # Already stored in the rollups: only the in-memory copy is rebuilt
+        self._add(rows, pending=False)
+
+    def add(self, rows):
+        self._add(rows, pending=True)
+
+    def _add(self, rows, pending):
+        for timestamp, cpu_usage, ram_usage in rows:
+            for resolution in RESOLUTIONS:
+                bucket = timestamp - timestamp % resolution
+                targets = [self._open[resolution]] + ([self._pending[resolution]] if pending else [])
+                for buckets in targets:
+                    cpu, ram = buckets.setdefault(bucket, ([], []))
+                    cpu.append(cpu_usage)
+                    ram.append(ram_usage)
+
+    def write(self, conn):
+        """Merges uncommitted samples into the rollup rows (inside the caller's transaction)."""
+        for resolution, table in RESOLUTIONS.items():
+            rows = []
+            for bucket, (cpu, ram) in self._pending[resolution].items():
+                full_cpu, full_ram = self._open[resolution][bucket]
+                rows.append({
+                    "bucket": bucket, "count": len(cpu), "full_count": len(full_cpu),
+                    "cpu_min": min(cpu), "cpu_sum": sum(cpu), "cpu_max": max(cpu),
+                    "ram_min": min(ram), "ram_sum": sum(ram), "ram_max": max(ram),
+                    "cpu_p95": percentile(cpu, 0.95), "ram_p95": percentile(ram, 0.95),
+                    "full_cpu_p95": percentile(full_cpu, 0.95), "full_ram_p95": percentile(full_ram, 0.95),
+                })
+            conn.executemany(f'''
+                INSERT INTO {table}
+                    (bucket, count, cpu_min, cpu_sum, cpu_max, cpu_p95, ram_min, ram_sum, ram_max, ram_p95)
+                VALUES (:bucket, :count, :cpu_min, :cpu_sum, :cpu_max,
+                        CASE WHEN :count = :full_count THEN :full_cpu_p95 ELSE :cpu_p95 END,
+                        :ram_min, :ram_sum, :ram_max,
+                        CASE WHEN :count = :full_count THEN :full_ram_p95 ELSE :ram_p95 END)
+                ON CONFLICT(bucket) DO UPDATE SET
+                    count = count + excluded.count,
+                    cpu_min = MIN(cpu_min, excluded.cpu_min),
+                    cpu_sum = cpu_sum + excluded.cpu_sum,
+                    cpu_max = MAX(cpu_max, excluded.cpu_max),
+                    cpu_p95 = CASE WHEN count + excluded.count = :full_count THEN :full_cpu_p95
+                                   ELSE MAX(cpu_p95, :cpu_p95) END,
+                    ram_min = MIN(ram_min, excluded.ram_min),
+                    ram_sum = ram_sum + excluded.ram_sum,
+                    ram_max = MAX(ram_max, excluded.ram_max),
+                    ram_p95 = CASE WHEN count + excluded.count = :full_count THEN :full_ram_p95
+                                   ELSE MAX(ram_p95, :ram_p95) END
+            ''', rows)
+
+    def committed(self, now=None):
+        """Forgets the merged samples and closed buckets; call after the write's transaction commits."""
+        now = int(now if now is not None else time.time())
+        for resolution in RESOLUTIONS:
+            self._pending[resolution].clear()
+            buckets = self._open[resolution]
+            current = now - now % resolution
+            for bucket in [b for b in buckets if b < current]:
+                del buckets[bucket]
+
+
+def apply_retention(conn, now=None):
+    """Deletes raw samples and rollups older than their retention window."""
+    now = int(now if now is not None else time.time())
+    deleted = {}
+    with conn:
+        for resolution, keep in RETENTION.items():
+            if keep is None:
+                continue
+            if resolution == 0:
+                cur = conn.execute("DELETE FROM usage WHERE timestamp < ?", (now - keep,))
+                deleted["raw"] = cur.rowcount
+                cur = conn.execute("DELETE FROM host_metrics WHERE end_ts < ?", (now - keep,))
+                deleted["host_metrics"] = cur.rowcount
+            else:
+                cur = conn.execute(f"DELETE FROM {RESOLUTIONS[resolution]} WHERE bucket < ?", (now - keep,))
+                deleted[RESOLUTIONS[resolution]] = cur.rowcount
+    return deleted
+
+
+def choose_resolution(start, step, now=None):
+    """Picks the coarsest stored resolution that is no coarser than `step`
+    and still retains data back to `start`."""
+    now = int(now if now is not None else time.time())
+    candidates = [0] + sorted(RESOLUTIONS)
+    fitting = [r for r in candidates if r <= step] or [0]
+    chosen = fitting[-1]
+    # Fall back to coarser data when the finer table has already been pruned
+    for resolution in candidates[candidates.index(chosen):]:
+        keep = RETENTION.get(resolution)
+        chosen = resolution
+        if keep is None or start >= now - keep:
+            break
+    return chosen
+
+
+def query_history(conn, start, end, step, now=None):
+    """Returns usage history between start and end (epoch seconds) in `step`-second buckets.
+
+    Each point has min/avg/max/p95 for CPU and RAM. When reading rollups the
+    p95 of a wider step is the maximum of the rollup p95s, an upper bound.
+    """
+    start, end, step = int(start), int(end), int(step)
+    if step <= 0 or end <= start:
+        raise ValueError("Need from < to and step > 0")
+    if (end - start) / step > MAX_POINTS:
+        raise ValueError(f"Query would return more than {MAX_POINTS} points; increase step")
+
+    resolution = choose_resolution(start, step, now)
+    if resolution == 0:
+        points = _raw_history(conn, start, end, step)
+    else:
+        points = _rollup_history(conn, resolution, start, end, step)
+    return {
+        "from": start,
+        "to": end,
+        "step": step,
+        "source": "usage" if resolution == 0 else RESOLUTIONS[resolution],
+        "points": points,
+    }
+
+
+def _raw_history(conn, start, end, step):
+    rows = conn.execute(
+        "SELECT timestamp, cpu_usage, ram_usage FROM usage WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+        (start, end),
+    )
+    grouped = {}
+    for timestamp, cpu_usage, ram_usage in rows:
+        bucket = start + (timestamp - start) // step * step
+        cpu, ram = grouped.setdefault(bucket, ([], []))
+        cpu.append(cpu_usage)
+        ram.append(ram_usage)
+
+    points = []
+    for bucket in sorted(grouped):
+        cpu, ram = grouped[bucket]
+        point = {"timestamp": bucket, "count": len(cpu)}
+        for name, values in (("cpu", cpu), ("ram", ram)):
+            point[name] = {
+                "min": min(values),
+                "avg": sum(values) / len(values),
+                "max": max(values),
+                "p95": percentile(values, 0.95),
+            }
+        points.append(point)
+    return points
+
+
+def _rollup_history(conn, resolution, start, end, step):
+    # Include the bucket that straddles `start`; it is folded into the first slot
+    rows = conn.execute(f'''
+        SELECT ? + MAX(bucket - ?, 0) / ? * ? AS slot, SUM(count),
+               MIN(cpu_min), SUM(cpu_sum), MAX(cpu_max), MAX(cpu_p95),
+               MIN(ram_min), SUM(ram_sum), MAX(ram_max), MAX(ram_p95)
+        FROM {RESOLUTIONS[resolution]}
+        WHERE bucket > ? AND bucket < ?
+        GROUP BY slot ORDER BY slot
+    ''', (start, start, step, step, start - resolution, end))
+    points = []
+    for slot, count, cpu_min, cpu_sum, cpu_max, cpu_p95, ram_min, ram_sum, ram_max, ram_p95 in rows:
+        points.append({
+            "timestamp": slot,
+            "count": count,
+            "cpu": {"min": cpu_min, "avg": cpu_sum / count, "max": cpu_max, "p95": cpu_p95},
+            "ram": {"min": ram_min, "avg": ram_sum / count, "max": ram_max, "p95": ram_p95},
+        })
+    return points
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+MAX_PAGE_BYTES = 32 * 1024 * 1024  # estimated memory for cached listing pages
+
+
+def _sizeof(*objects):
+    """Rough retained size of flat tuples/strings/ints, for the memory estimate."""
+    total = 0
+    for obj in objects:
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (tuple, list)):
+            total += sum(sys.getsizeof(item) if not isinstance(item, (tuple, list)) else _sizeof(item) for item in obj)
+    return total
+
+
+class _Lru:
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires_at, value, size)
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value, _ = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self.pop(key)
+            return _MISSING
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, ttl=None):
+        self.pop(key)
+        size = _sizeof(key, value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        self.entries[key] = (time.monotonic() + ttl if ttl else None, value, size)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry is not None
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+class UserCache:
+    """In-process read-through cache for user lookups and listing pages.
+
+    Lookups map username -> (id, username) in a bounded LRU. With
+    `negative_ttl` set, unknown usernames are cached as None for that many
+    seconds. Listing pages are cached separately, keyed by (cursor, limit,
+    prefix), and bounded by estimated size (`max_page_bytes`) as well as
+    count, since one page can hold up to MAX_PAGE_SIZE rows.
+
+    Writes invalidate precisely: upserted usernames are dropped from the
+    lookup tier, and listing pages are dropped only when a write inserted a
+    new user (password updates do not change a listing). Fills carry the
+    write generation observed before the read, so a fill that raced a write
+    is discarded instead of caching stale data.
+
+    Used from the event loop only, so it takes no locks.
+    """
+
+    def __init__(self, max_entries=10000, negative_ttl=None, max_pages=256, max_page_bytes=MAX_PAGE_BYTES):
+        self.negative_ttl = negative_ttl
+        self._users = _Lru(max_entries)
+        self._pages = _Lru(max_pages, max_page_bytes)
+        self.generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.page_hits = 0
+        self.page_misses = 0
+        self.invalidations = 0
+
+    # --- user lookups ----------------------------------------------------------------
+
+    def get_user(self, username):
+        """Returns (found_in_cache, user_or_None)."""
+        value = self._users.get(username)
+        if value is _MISSING:
+            self.misses += 1
+            return False, None
+        if value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, value
+
+    def put_user(self, username, user, generation):
+        if generation != self.generation:
+            return
+        if user is not None:
+            self._users.put(username, user)
+        elif self.negative_ttl:
+            self._users.put(username, None, ttl=self.negative_ttl)
+
+    # --- listing pages ----------------------------------------------------------------
+
+    def get_page(self, key):
+        value = self._pages.get(key)
+        if value is _MISSING:
+            self.page_misses += 1
+            return None
+        self.page_hits += 1
+        return value
+
+    def put_page(self, key, page, generation):
+        if generation == self.generation:
+            self._pages.put(key, page)
+
+    # --- invalidation --------------------------------------------------------------
+
+    def invalidate(self, usernames, inserted):
+        """Called after a write committed: drops the written usernames and, if any
+        row was inserted, every cached listing page."""
+        self.generation += 1
+        for username in usernames:
+            if self._users.pop(username):
+                self.invalidations += 1
+        if inserted:
+            self.invalidations += len(self._pages.entries)
+            self._pages.clear()
+
+    def clear(self):
+        self.generation += 1
+        self._users.clear()
+        self._pages.clear()
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        page_lookups = self.page_hits + self.page_misses
+        return {
+            "entries": len(self._users.entries),
+            "max_entries": self._users.max_entries,
+            "negative_ttl": self.negative_ttl,
+            "pages": len(self._pages.entries),
+            "max_pages": self._pages.max_entries,
+            "page_bytes": self._pages.bytes,
+            "max_page_bytes": self._pages.max_bytes,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0,
+            "page_hit_rate": self.page_hits / page_lookups if page_lookups else 0,
+            "evictions": self._users.evictions + self._pages.evictions,
+            "invalidations": self.invalidations,
+            "memory_bytes": self._users.bytes + self._pages.bytes,
+        }
+
+
+def user_cache_from_env(prefix="USER_CACHE"):
+    """Creates a UserCache from <prefix>_SIZE/_NEGATIVE_TTL/_PAGES/_PAGE_BYTES env vars; size 0 disables it."""
+    size = int(os.environ.get(f"{prefix}_SIZE", 10000))
+    if size <= 0:
+        return None
+    negative_ttl = os.environ.get(f"{prefix}_NEGATIVE_TTL")
+    return UserCache(
+        max_entries=size,
+        negative_ttl=float(negative_ttl) if negative_ttl else None,
+        max_pages=int(os.environ.get(f"{prefix}_PAGES", 256)),
+        max_page_bytes=int(os.environ.get(f"{prefix}_PAGE_BYTES", MAX_PAGE_BYTES)),
+    )
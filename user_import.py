@@ -0,0 +1,101 @@
+import csv
+import json
+
+from user_store import normalize_username
+
+BULK_CHUNK = 1000  # rows per transaction
+FORMATS = ("json", "ndjson", "csv")
+CONTENT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+
+class BulkImportError(ValueError):
+    """The request body cannot be parsed at all (as opposed to one bad row)."""
+
+
+def detect_format(content_type, explicit=None):
+    if explicit:
+        return explicit
+    fmt = CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if fmt is None:
+        raise BulkImportError(f"Unsupported content type {content_type!r}; use JSON, NDJSON or CSV or pass ?format=")
+    return fmt
+
+
+def validate(record):
+    """Returns (username, password) or raises ValueError for a bad row."""
+    if not isinstance(record, dict):
+        raise ValueError("row must be an object with username and password")
+    username, password = record.get("username"), record.get("password")
+    if not isinstance(username, str) or not normalize_username(username):
+        raise ValueError("username must be a non-empty string")
+    if not isinstance(password, str) or not password:
+        raise ValueError("password must be a non-empty string")
+    return normalize_username(username), password
+
+
+async def _lines(stream):
+    """Splits an async stream of byte chunks into raw lines without holding the body."""
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+async def iter_records(stream, fmt):
+    """Yields (row_number, record_or_exception) from a JSON array, NDJSON or CSV body.
+
+    NDJSON and CSV are parsed line by line as the body arrives; a JSON array
+    has to be read whole. CSV needs a header with username and password
+    columns (quoted fields may not contain newlines). A line that is not
+    valid UTF-8 is reported as an error for that row.
+    """
+    if fmt == "json":
+        body = b"".join([chunk async for chunk in stream])
+        try:
+            records = json.loads(body or b"[]")
+        except ValueError as e:
+            raise BulkImportError(f"Invalid JSON: {e}") from e
+        if not isinstance(records, list):
+            raise BulkImportError("JSON body must be an array of users")
+        for number, record in enumerate(records, 1):
+            yield number, record
+        return
+
+    number = 0
+    header = None
+    async for raw in _lines(stream):
+        if not raw.strip():
+            continue
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            if fmt == "csv" and header is None:
+                raise BulkImportError("CSV header is not valid UTF-8")
+            number += 1
+            yield number, ValueError("row is not valid UTF-8")
+            continue
+        if fmt == "csv":
+            fields = next(csv.reader([line]))
+            if header is None:
+                header = [f.strip().lower() for f in fields]
+                if "username" not in header or "password" not in header:
+                    raise BulkImportError("CSV header must name username and password columns")
+                continue
+            number += 1
+            yield number, dict(zip(header, fields))
+        else:
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f"invalid JSON: {e}")
@@ -0,0 +1,283 @@
+import asyncio
+import base64
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import observe_query
+from sqlite_wal import connect
+
+DB_PATH = "users.db"
+READERS = 4
+STATEMENT_CACHE = 256  # prepared statements kept per connection
+
+# SQL is kept in module constants: sqlite3 caches the prepared statement per
+# connection keyed by the SQL text, so pooled connections never re-prepare them
+UPSERT_USER = ("INSERT INTO users (username, password) VALUES (?, ?) "
+               "ON CONFLICT(username) DO UPDATE SET password = excluded.password")
+# Keyset pages: by id, or by username (on its unique index) within a prefix range
+PAGE_BY_ID = "SELECT id, username FROM users WHERE id > ? ORDER BY id LIMIT ?"
+PAGE_BY_USERNAME = ("SELECT id, username FROM users WHERE username > ? AND username >= ? AND username < ? "
+                    "ORDER BY username LIMIT ?")
+PAGE_BY_USERNAME_UNBOUNDED = ("SELECT id, username FROM users WHERE username > ? AND username >= ? "
+                              "ORDER BY username LIMIT ?")
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+SELECT_USER = "SELECT id, username FROM users WHERE username = ?"
+MAX_IN_PARAMS = 500  # usernames per existence query (well below SQLite's variable limit)
+
+
+def normalize_username(username):
+    """Canonical form of a username, applied on every write and lookup path."""
+    return username.strip()
+
+
+def init_user_schema(conn):
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE,
+                password TEXT
+            )
+        ''')
+
+
+class ConnectionPool:
+    """A fixed set of long-lived WAL-mode connections: one writer, `readers` readers.
+
+    SQLite allows a single writer at a time, so writes share one connection
+    behind a lock instead of contending for the database lock; WAL lets the
+    readers run concurrently with it. Connections are created up front and
+    reused, together with their prepared-statement caches. Query times are
+    exported on /metrics labelled with `name`.
+    """
+
+    def __init__(self, db_path=DB_PATH, readers=READERS, name="users"):
+        self.db_path = db_path
+        self.name = name
+        self.readers = readers
+        # Autocommit mode; _write issues BEGIN IMMEDIATE so each write holds the lock from its first statement
+        self._writer = connect(db_path, cached_statements=STATEMENT_CACHE, isolation_level=None)
+        self._write_lock = threading.Lock()
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            conn = connect(db_path, cached_statements=STATEMENT_CACHE)
+            conn.execute("PRAGMA query_only=1")
+            self._readers.put(conn)
+        # One thread per connection, so a task never waits for a connection inside the pool
+        self._executor = ThreadPoolExecutor(max_workers=readers + 1, thread_name_prefix="user-db")
+        self._stats_lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.read_ms = 0.0
+        self.write_ms = 0.0
+
+    def _read(self, fn, args):
+        conn = self._readers.get()
+        started = time.perf_counter()
+        try:
+            return fn(conn, *args)
+        finally:
+            self._readers.put(conn)
+            elapsed = time.perf_counter() - started
+            observe_query(self.name, "read", elapsed)
+            with self._stats_lock:
+                self.reads += 1
+                self.read_ms += elapsed * 1000
+
+    def _write(self, fn, args):
+        with self._write_lock:
+            started = time.perf_counter()
+            try:
+                self._writer.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(self._writer, *args)
+                except BaseException:
+                    self._writer.execute("ROLLBACK")
+                    raise
+                self._writer.execute("COMMIT")
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                observe_query(self.name, "write", elapsed)
+                with self._stats_lock:
+                    self.writes += 1
+                    self.write_ms += elapsed * 1000
+
+    async def read(self, fn, *args):
+        """Runs fn(conn, *args) on a reader connection in the pool's threads."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._read, fn, args)
+
+    async def write(self, fn, *args):
+        """Runs fn(conn, *args) in a transaction on the writer connection."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._write, fn, args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "readers": self.readers,
+                "idle_readers": self._readers.qsize(),
+                "reads": self.reads,
+                "writes": self.writes,
+                "avg_read_ms": round(self.read_ms / self.reads, 3) if self.reads else None,
+                "avg_write_ms": round(self.write_ms / self.writes, 3) if self.writes else None,
+            }
+
+
+def _existing_usernames(conn, usernames):
+    found = set()
+    usernames = list(set(usernames))
+    for i in range(0, len(usernames), MAX_IN_PARAMS):
+        part = usernames[i:i + MAX_IN_PARAMS]
+        sql = f"SELECT username FROM users WHERE username IN ({', '.join('?' * len(part))})"
+        found.update(row[0] for row in conn.execute(sql, part))
+    return found
+
+
+def _upsert_users(conn, rows):
+    """Upserts (username, password) rows with one executemany; returns "inserted"/"updated" per row.
+
+    Runs inside the writer's immediate transaction, so the existence check
+    and the upsert see the same state.
+    """
+    existing = _existing_usernames(conn, [username for username, _ in rows])
+    outcomes = []
+    for username, _ in rows:
+        outcomes.append("updated" if username in existing else "inserted")
+        existing.add(username)  # a later duplicate in the same batch updates the first
+    conn.executemany(UPSERT_USER, rows)
+    return outcomes
+
+
+def _get_user(conn, username):
+    return conn.execute(SELECT_USER, (username,)).fetchone()
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, key):
+    """Inverse of encode_cursor for a position keyed by `key` ("id" or "u").
+
+    Raises ValueError for anything encode_cursor did not produce, including a
+    cursor from the other ordering: it would silently restart at page one.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    expected = int if key == "id" else str
+    if not isinstance(position, dict) or set(position) != {key} or type(position[key]) is not expected:
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def prefix_range(prefix):
+    """[low, high) bounds matching every string that starts with `prefix` (binary collation).
+
+    high is None when there is no upper bound, i.e. the prefix is all
+    U+10FFFF, the largest code point.
+    """
+    stem = prefix.rstrip(chr(0x10FFFF))
+    if not stem:
+        return prefix, None
+    return prefix, stem[:-1] + chr(ord(stem[-1]) + 1)
+
+
+def _page(conn, position, limit, prefix):
+    """Returns (rows, next_position); rows are (id, username)."""
+    if prefix:
+        low, high = prefix_range(prefix)
+        if high is None:
+            rows = conn.execute(PAGE_BY_USERNAME_UNBOUNDED, (position.get("u", ""), low, limit)).fetchall()
+        else:
+            rows = conn.execute(PAGE_BY_USERNAME, (position.get("u", ""), low, high, limit)).fetchall()
+        next_position = {"u": rows[-1][1]} if len(rows) == limit else None
+    else:
+        rows = conn.execute(PAGE_BY_ID, (position.get("id", 0), limit)).fetchall()
+        next_position = {"id": rows[-1][0]} if len(rows) == limit else None
+    return rows, next_position
+
+
+class UserStore:
+    """Data access for the user management API, with an optional read-through
+    UserCache (see user_cache.py) in front of lookups and listing pages."""
+
+    def __init__(self, db_path=DB_PATH, readers=READERS, cache=None):
+        conn = connect(db_path)
+        init_user_schema(conn)  # once per process, not per request
+        conn.close()
+        self.pool = ConnectionPool(db_path, readers)
+        self.cache = cache
+
+    async def add_user(self, username, password):
+        """Adds the user or updates their password; returns "inserted" or "updated"."""
+        return (await self.upsert_users([(username, password)]))[0]
+
+    async def upsert_users(self, rows):
+        """Upserts many (username, password) rows in one transaction; returns per-row outcomes."""
+        rows = [(normalize_username(username), password) for username, password in rows]
+        outcomes = await self.pool.write(_upsert_users, rows)
+        if self.cache is not None:
+            self.cache.invalidate([username for username, _ in rows], inserted="inserted" in outcomes)
+        return outcomes
+
+    async def get_user(self, username):
+        """Returns (id, username) or None."""
+        username = normalize_username(username)
+        if self.cache is None:
+            return await self.pool.read(_get_user, username)
+        found, user = self.cache.get_user(username)
+        if found:
+            return user
+        generation = self.cache.generation
+        user = await self.pool.read(_get_user, username)
+        self.cache.put_user(username, tuple(user) if user else None, generation)
+        return user
+
+    async def list_page(self, cursor=None, limit=DEFAULT_PAGE_SIZE, prefix=None):
+        """Returns (rows, next_cursor) for one keyset page; next_cursor is None on the last page.
+
+        Without a prefix pages follow id order; with one they follow username
+        order, so both are a single range scan on an index.
+        """
+        key = (cursor, limit, prefix)
+        if self.cache is not None:
+            page = self.cache.get_page(key)
+            if page is not None:
+                return page
+            generation = self.cache.generation
+        position = decode_cursor(cursor, "u" if prefix else "id") if cursor else {}
+        rows, next_position = await self.pool.read(_page, position, limit, prefix)
+        page = (rows, encode_cursor(next_position) if next_position else None)
+        if self.cache is not None:
+            self.cache.put_page(key, page, generation)
+        return page
+
+    async def iter_users(self, prefix=None, page_size=DEFAULT_PAGE_SIZE):
+        """Yields (id, username) for every matching user, one page in memory at a time.
+
+        Each page is its own read, so no connection is held while the caller
+        is busy with the rows.
+        """
+        position = {}
+        while position is not None:
+            rows, position = await self.pool.read(_page, position, page_size, prefix)
+            for row in rows:
+                yield row
+
+    def close(self):
+        self.pool.close()
+
+    def stats(self):
+        return {**self.pool.stats(), "cache": self.cache.stats() if self.cache is not None else None}
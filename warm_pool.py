@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime
+
+from cloud_backend import BAKED_STARTUP_SCRIPT, STARTUP_SCRIPT
+
+MODES = ("stopped", "running")
+
+
+class WarmPool:
+    """Keeps `size` spare backend instances ready for scale-out.
+
+    In "stopped" mode members are created from a baked image, allowed to
+    finish booting and then stopped: they cost only disk, and promotion is a
+    start instead of a full create. It needs `source_image`, because a member
+    on the stock image reruns the whole startup script (apt, docker) on every
+    start and would save nothing. In "running" mode members stay booted and
+    serving, so promotion is immediate. Whenever a member is taken, a refill
+    runs in the background. A member that fails to get ready is deleted.
+    """
+
+    def __init__(self, backend, size=0, mode="stopped", source_image=None, serving_timeout=900, poll_interval=2.0,
+                 on_ready=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown warm pool mode {mode!r}, expected one of {MODES}")
+        if mode == "stopped" and size > 0 and not source_image:
+            raise ValueError('Warm pool mode "stopped" needs a baked source image; use "running" without one')
+        self.backend = backend
+        self.size = size
+        self.mode = mode
+        self.source_image = source_image
+        self.startup_script = BAKED_STARTUP_SCRIPT if source_image else STARTUP_SCRIPT
+        self.serving_timeout = serving_timeout
+        self.poll_interval = poll_interval
+        self.on_ready = on_ready
+        self.ready = []       # names of members ready to promote
+        self.filling = set()  # names being created
+        self.promoted = 0
+        self.failures = 0
+        self._counter = itertools.count(1)
+        self._refill_task = None
+
+    def take(self):
+        """Returns a ready member's name (no longer part of the pool) or None."""
+        if not self.ready:
+            return None
+        name = self.ready.pop(0)
+        self.promoted += 1
+        self.refill()
+        return name
+
+    def refill(self):
+        if self.size > 0 and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        while len(self.ready) + len(self.filling) < self.size:
+            missing = self.size - len(self.ready) - len(self.filling)
+            names = [f"warm-pool-{datetime.now().strftime('%Y%m%d%H%M%S')}-{next(self._counter)}" for _ in range(missing)]
+            self.filling.update(names)
+            results = await asyncio.gather(*(self._prepare(name) for name in names), return_exceptions=True)
+            if any(isinstance(r, Exception) for r in results):
+                await asyncio.sleep(self.poll_interval * 15)  # Back off instead of hammering a failing API
+
+    async def _prepare(self, name):
+        try:
+            await asyncio.to_thread(self.backend.create_instance, name,
+                                    startup_script=self.startup_script, source_image=self.source_image)
+            await wait_serving(self.backend, name, self.serving_timeout, self.poll_interval)
+            if self.mode == "stopped":
+                await asyncio.to_thread(self.backend.stop_instance, name)
+            self.ready.append(name)
+            if self.on_ready is not None:
+                self.on_ready(name)
+        except Exception as e:
+            self.failures += 1
+            logging.error("Warm pool member %s failed: %s", name, e)
+            try:
+                await asyncio.to_thread(self.backend.delete_instance, name)
+            except Exception as delete_error:
+                # Left for the fleet's reconcile, which adopts or deletes warm-pool-* instances
+                logging.error("Deleting failed warm pool member %s failed: %s", name, delete_error)
+            raise
+        finally:
+            self.filling.discard(name)
+
+    async def promote(self, name):
+        """Brings a member taken from the pool into service."""
+        if self.mode == "stopped":
+            await asyncio.to_thread(self.backend.start_instance, name)
+
+    def stats(self):
+        return {"size": self.size, "mode": self.mode, "source_image": self.source_image,
+                "ready": len(self.ready), "filling": len(self.filling),
+                "promoted": self.promoted, "failures": self.failures}
+
+
+async def wait_serving(backend, name, timeout, poll_interval):
+    """Polls the backend until the instance answers on the app port."""
+    deadline = time.time() + timeout
+    while not await asyncio.to_thread(backend.is_serving, name):
+        if time.time() > deadline:
+            raise TimeoutError(f"{name} not serving after {timeout}s")
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,313 @@
+import itertools
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Connection, wait
+from multiprocessing.reduction import recv_handle, send_handle
+
+import torch
+import torch.multiprocessing as mp
+
+# Run the web server as ONE process (e.g. `gunicorn -w 1 --threads 16 app:app`)
+# and let this pool provide the parallelism: the weights live once in shared
+# memory and every worker process maps the same pages.
+
+PREDICT_TIMEOUT = 30.0  # seconds predict() waits before giving up on a request
+HEALTH_CHECK_INTERVAL = 0.5  # seconds between supervisor liveness checks
+
+
+def _pin_to_core(worker_id):
+    """Pins the current process to one core (Linux only, no-op elsewhere)."""
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    cores = sorted(os.sched_getaffinity(0))
+    core = cores[worker_id % len(cores)]
+    os.sched_setaffinity(0, {core})
+    return core
+
+
+def _worker_main(worker_id, model, conn, max_batch_size, max_wait):
+    """Worker loop: drain up to max_batch_size tasks from its own pipe, run one forward pass, reply."""
+    _pin_to_core(worker_id)
+    torch.set_num_threads(1)  # One core per worker, parallelism comes from the pool
+
+    while True:
+        try:
+            item = conn.recv()
+        except EOFError:
+            break
+        if item is None:
+            break
+        items = [item]
+        deadline = time.perf_counter() + max_wait
+        stopping = False
+        while len(items) < max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not conn.poll(remaining):
+                break
+            item = conn.recv()
+            if item is None:
+                stopping = True  # Finish this batch first
+                break
+            items.append(item)
+
+        request_ids = [request_id for request_id, _ in items]
+        try:
+            batch = torch.stack([tensor for _, tensor in items])
+            with torch.no_grad():
+                outputs = model(batch)
+            for request_id, row in zip(request_ids, outputs):
+                conn.send((request_id, row.clone(), None))
+        except Exception as e:
+            for request_id in request_ids:
+                conn.send((request_id, None, str(e)))
+        if stopping:
+            break
+
+
+def _supervise(model, control, parent_end, max_batch_size, max_wait):
+    """Supervisor process: forks a worker for every pipe the pool sends over `control`.
+
+    It is forked once, from the pool's constructor, and never starts threads,
+    so workers (replacements included) are always forked from a
+    single-threaded process instead of from the multi-threaded web server.
+    """
+    parent_end.close()
+    workers = {}  # pid -> worker id
+    try:
+        while True:
+            if wait([control], timeout=HEALTH_CHECK_INTERVAL):
+                try:
+                    worker_id = control.recv()
+                except EOFError:
+                    break  # The pool's process is gone
+                if worker_id is None:
+                    break
+                fd = recv_handle(control)
+                pid = os.fork()
+                if pid == 0:
+                    control.close()
+                    code = 0
+                    try:
+                        _worker_main(worker_id, model, Connection(fd), max_batch_size, max_wait)
+                    except BaseException:
+                        logging.exception("inference-worker-%d crashed", worker_id)
+                        code = 1
+                    finally:
+                        os._exit(code)
+                os.close(fd)
+                workers[pid] = worker_id
+                control.send(pid)
+            # Reap exited workers; the pool notices through the closed pipe
+            while workers:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                code = os.waitstatus_to_exitcode(status)
+                logging.log(logging.ERROR if code else logging.INFO, "inference-worker-%d (pid %d) exited with code %s",
+                            workers.pop(pid), pid, code)
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+class InferenceWorkerPool:
+    """Fans inference requests out to N processes that share one copy of the model.
+
+    Exposes the same submit()/predict()/stats() interface as BatchScheduler so
+    the Flask app can use either one.
+
+    Each worker has its own pipe and the pool assigns every request to one
+    worker (the least busy), so it always knows which requests a worker
+    holds. A worker that dies (OOM kill, segfault) closes its pipe: the
+    results thread fails all of its requests with RuntimeError and asks the
+    supervisor process for a replacement on a fresh pipe. The supervisor is
+    forked once at construction, so create the pool from the main thread
+    before the web server starts its threads.
+    """
+
+    def __init__(self, model, num_workers=None, max_batch_size=8, max_wait_ms=2):
+        if not num_workers:
+            num_workers = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        self.num_workers = num_workers
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        # Move parameters and buffers into shared memory before forking.
+        # Frozen TorchScript/int8 variants have no shareable parameters and
+        # rely on copy-on-write pages instead.
+        try:
+            model.share_memory()
+        except (RuntimeError, AttributeError) as e:
+            logging.warning("Could not move model to shared memory: %s", e)
+
+        # fork keeps the shared storages mapped in the supervisor and every
+        # worker without re-importing the app module (spawn would re-run
+        # app.py's top level)
+        ctx = mp.get_context("fork")
+        self._control, supervisor_end = ctx.Pipe()
+        self._supervisor = ctx.Process(
+            target=_supervise,
+            args=(model, supervisor_end, self._control, max_batch_size, self.max_wait),
+            name="inference-supervisor",
+            daemon=True,
+        )
+        self._supervisor.start()
+        supervisor_end.close()
+
+        self._conns = [None] * num_workers     # pool end of each worker's pipe, None while down
+        self._send_locks = [threading.Lock() for _ in range(num_workers)]
+        self._assigned = [dict() for _ in range(num_workers)]  # request id -> Future, per worker
+        self._pids = [None] * num_workers
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._completed = 0
+        self._restarts = 0
+        self._stopping = False
+        for worker_id in range(num_workers):
+            self._start_worker(worker_id)
+        logging.info("Started %d inference workers", self.num_workers)
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="inference-results", daemon=True)
+        self._dispatcher.start()
+
+    def _start_worker(self, worker_id):
+        """Hands a fresh pipe to the supervisor, which forks a worker on it.
+
+        Only called from the constructor and then the results thread, the
+        only users of the control pipe.
+        """
+        conn, worker_end = mp.Pipe()
+        try:
+            self._control.send(worker_id)
+            send_handle(self._control, worker_end.fileno(), self._supervisor.pid)
+            pid = self._control.recv()
+        except (OSError, EOFError) as e:
+            conn.close()
+            logging.error("Could not start inference-worker-%d: supervisor unavailable (%s)", worker_id, e)
+            return
+        finally:
+            worker_end.close()
+        with self._lock:
+            self._conns[worker_id], self._pids[worker_id] = conn, pid
+
+    def submit(self, tensor):
+        """Queues one image tensor and returns a Future for its output row."""
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            live = [i for i, conn in enumerate(self._conns) if conn is not None]
+            if not live:
+                raise RuntimeError("No inference workers available")
+            worker_id = min(live, key=lambda i: len(self._assigned[i]))
+            conn = self._conns[worker_id]
+            self._assigned[worker_id][request_id] = future
+        try:
+            with self._send_locks[worker_id]:
+                conn.send((request_id, tensor))
+        except OSError as e:
+            # The worker died under us; the results thread fails the request
+            logging.warning("Sending to inference-worker-%d failed: %s", worker_id, e)
+        return future
+
+    def predict(self, tensor, timeout=PREDICT_TIMEOUT):
+        """Blocking helper: submits one tensor and waits for its output row."""
+        return self.submit(tensor).result(timeout=timeout)
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                conns = {conn: i for i, conn in enumerate(self._conns) if conn is not None}
+            ready = wait(list(conns), timeout=HEALTH_CHECK_INTERVAL) if conns else []
+            if not conns:
+                time.sleep(HEALTH_CHECK_INTERVAL)
+            for conn in ready:
+                worker_id = conns[conn]
+                try:
+                    request_id, row, error = conn.recv()
+                except Exception:  # Closed, or torn mid-message by the worker's death
+                    self._worker_died(worker_id, conn)
+                    continue
+                with self._lock:
+                    future = self._assigned[worker_id].pop(request_id, None)
+                    self._completed += 1
+                if future is None:
+                    continue
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result(row)
+            if self._stopping and not conns:
+                return
+            if not self._stopping:
+                self._restart_missing()
+
+    def _worker_died(self, worker_id, conn):
+        """Fails every request the worker held and drops its pipe."""
+        with self._lock:
+            self._conns[worker_id] = None
+            lost = self._assigned[worker_id]
+            self._assigned[worker_id] = {}
+        conn.close()
+        name = f"inference-worker-{worker_id}"
+        if self._stopping:
+            error = RuntimeError("Inference pool shut down")
+        else:
+            error = RuntimeError(f"{name} (pid {self._pids[worker_id]}) died")
+        for future in lost.values():
+            future.set_exception(error)
+        if not self._stopping:
+            logging.error("%s died; failed %d requests, restarting it", name, len(lost))
+
+    def _restart_missing(self):
+        for worker_id, conn in enumerate(self._conns):
+            if conn is None and self._supervisor.is_alive():
+                self._start_worker(worker_id)
+                if self._conns[worker_id] is not None:
+                    self._restarts += 1
+
+    def shutdown(self):
+        self._stopping = True
+        with self._lock:
+            conns = list(enumerate(self._conns))
+        for worker_id, conn in conns:
+            if conn is not None:
+                try:
+                    with self._send_locks[worker_id]:
+                        conn.send(None)
+                except OSError:
+                    pass
+        self._dispatcher.join(timeout=5)
+        try:
+            self._control.send(None)
+        except OSError:
+            pass
+        self._supervisor.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            pending = sum(len(assigned) for assigned in self._assigned)
+            completed = self._completed
+            alive = sum(conn is not None for conn in self._conns)
+        return {
+            "mode": "worker_pool",
+            "workers": self.num_workers,
+            "alive_workers": alive,
+            "supervisor_alive": self._supervisor.is_alive(),
+            "restarts": self._restarts,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": pending,
+            "completed": completed,
+        }